@@ -0,0 +1,290 @@
+"""
+Benchmark suite with fixed seeds and configs. Run from the project root:
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --output results.json --baseline baseline.json --threshold 0.1
+
+With a baseline given, results are compared against it and the exit status is 1 if any benchmark regressed by more
+than the threshold. Exit status is also 1 if a correctness check of the suite fails.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from envs.batch_brown_inventory_time_env import BatchBrownInventoryTimeStateEnv
+from envs.brown_inventory_env import BrownInventoryStateEnv
+from envs.brown_inventory_time_env import BrownInventoryTimeStateEnv
+from envs.order_book_env import OrderBookEnv
+from learning.agents import batch_q_learning, q_learning, random_actions, zero_tick
+from models.brownian_model import StochasticProcess
+from models.path_bank import PathBank
+
+SEED = 0
+
+
+def _quiet(episode, num_episodes):
+    """Progress callback that prints nothing."""
+    pass
+
+
+def _seed():
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+
+def _best_time(function, repeat):
+    """
+    :return: Shortest wall time of repeat calls of function
+    """
+    times = []
+    for _ in range(repeat):
+        _seed()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_env_steps(env_class, n_steps, repeat):
+    """
+    Raw env steps/sec, cycling through all actions and resetting finished episodes.
+    """
+    _seed()
+    env = env_class(1, 0.005, StochasticProcess(1, 0.005, 2, 100), 4, 1)
+
+    def run():
+        env.reset()
+        for step in range(n_steps):
+            if env.step(step % 9)[2]:
+                env.reset()
+
+    return n_steps / _best_time(run, repeat)
+
+
+def bench_batch_env_steps(n_envs, n_steps, repeat):
+    """
+    Steps/sec of single episodes simulated by BatchBrownInventoryTimeStateEnv.
+    """
+    env = BatchBrownInventoryTimeStateEnv(n_envs, 1, 0.005, StochasticProcess(1, 0.005, 2, 100, rng=SEED), 4, 1,
+                                          rng=np.random.default_rng(SEED))
+    actions = np.arange(n_envs) % 9
+
+    def run():
+        env.reset()
+        for _ in range(n_steps):
+            if env.step(actions)[2][0]:
+                env.reset()
+
+    return n_envs * n_steps / _best_time(run, repeat)
+
+
+def bench_order_book_events(n_steps, repeat):
+    """
+    Order book events/sec simulated by OrderBookEnv, cycling through all actions. A first step compiles the event loop
+    before timing.
+    """
+    env = OrderBookEnv(1, 0.005, 4, 1, rng=np.random.default_rng(SEED))
+    env.reset()
+    env.step(0)
+
+    def run():
+        env.reset()
+        for step in range(n_steps):
+            if env.step(step % 9)[2]:
+                env.reset()
+
+    start = env.n_events
+    duration = _best_time(run, repeat)
+    return (env.n_events - start) / repeat / duration
+
+
+def bench_path_generation(n_steps, n_paths, repeat):
+    """
+    Paths/sec generated one by one with generate_series, and in one generate_batch call.
+    """
+    process = StochasticProcess(n_steps * 0.005, 0.005, 2, 100)
+
+    def series():
+        for _ in range(n_paths):
+            process.generate_series()
+
+    return n_paths / _best_time(series, repeat), n_paths / _best_time(lambda: process.generate_batch(n_paths), repeat)
+
+
+def bench_batch_q_learning(n_episodes, n_envs=(1, 1024)):
+    """
+    Largest absolute action value learned by batch_q_learning with different numbers of episodes in lockstep. Sizes
+    should be comparable, updates of the same pair are averaged, not summed.
+    :return: list of max |Q|, one per number of environments
+    """
+    magnitudes = []
+    for n in n_envs:
+        _seed()
+        env = BatchBrownInventoryTimeStateEnv(n, 1, 0.005, StochasticProcess(1, 0.005, 2, 100, rng=SEED), 4, 1,
+                                              rng=np.random.default_rng(SEED))
+        Q, _ = batch_q_learning(env, n_episodes, progress=_quiet)
+        magnitudes.append(float(np.abs(Q.values).max()))
+    return magnitudes
+
+
+def bench_comparison(n_episodes):
+    """
+    main.py-style comparison of Q-learning, zero-tick and random agents on shared price paths.
+    :return: wall time and peak traced memory
+    """
+    _seed()
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    bank = PathBank.from_process(StochasticProcess(1, 0.005, 2, 100), n_episodes)
+    paths = bank.replay()
+    env = BrownInventoryTimeStateEnv(1, 0.005, paths, 4, 1)
+    for agent in (q_learning, zero_tick, random_actions):
+        paths.seek(0)
+        agent(env, n_episodes, progress=_quiet)
+
+    duration = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak_memory
+
+
+def bench_plotting(n_episodes, repeat):
+    """
+    Time to draw relative profit and smoothed reward plots of three agents, without showing them.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+    from plotting import plot_utils
+
+    rng = np.random.default_rng(SEED)
+    statlist = [plot_utils.EpisodeStats(label, *(rng.normal(1000, 10, n_episodes) for _ in range(4)))
+                for label in ("Q-learning", "Zero-tick", "Random actions")]
+
+    def run():
+        plot_utils.plot_relative_profits(statlist, 1)
+        plot_utils.plot_episode_rewards(statlist[0], 50)
+        plt.close("all")
+
+    return _best_time(run, repeat)
+
+
+def run_suite(scale=1., repeat=3):
+    """
+    Run all benchmarks.
+    :param scale: multiplier of problem sizes, smaller for quick runs
+    :param repeat: number of repetitions, best one is reported
+    :return: dictionary mapping benchmark name -> {"value", "unit", "higher_is_better"}, higher_is_better being None
+    for values of correctness checks, which are left to check() and not compared against a baseline
+    """
+    results = {}
+
+    def add(name, value, unit, higher_is_better=True):
+        results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+        print("{:<45} {:>16.2f} {}".format(name, value, unit))
+
+    for env_class in (BrownInventoryStateEnv, BrownInventoryTimeStateEnv):
+        add("env_steps/" + env_class.__name__, bench_env_steps(env_class, int(20000 * scale), repeat), "steps/s")
+    add("env_steps/BatchBrownInventoryTimeStateEnv",
+        bench_batch_env_steps(1000, int(2000 * scale), repeat), "steps/s")
+
+    add("order_book/events", bench_order_book_events(int(20000 * scale), repeat), "events/s")
+
+    for n_steps in (100, 1000, 10000):
+        series, batch = bench_path_generation(n_steps, max(1, int(1000000 * scale) // n_steps), repeat)
+        add("path_generation/series/{}".format(n_steps), series, "paths/s")
+        add("path_generation/batch/{}".format(n_steps), batch, "paths/s")
+
+    single, batched = bench_batch_q_learning(max(2048, int(8192 * scale)))
+    add("batch_q_learning/max_q/1", single, "", higher_is_better=None)
+    add("batch_q_learning/max_q/1024", batched, "", higher_is_better=None)
+    add("batch_q_learning/max_q_ratio", batched / single, "", higher_is_better=None)
+
+    duration, peak_memory = bench_comparison(max(1, int(200 * scale)))
+    add("comparison/time", duration, "s", higher_is_better=False)
+    add("comparison/peak_memory", peak_memory / 2 ** 20, "MiB", higher_is_better=False)
+
+    add("plotting/time", bench_plotting(int(100000 * scale), repeat), "s", higher_is_better=False)
+
+    return results
+
+
+def check(results, tolerance=2.):
+    """
+    Correctness checks on results of the suite.
+    :param tolerance: largest allowed ratio of max |Q| of batched and single-episode Q-learning, either way
+    :return: list of names of failed checks
+    """
+    failures = []
+    ratio = results["batch_q_learning/max_q_ratio"]["value"]
+    if not 1 / tolerance <= ratio <= tolerance:
+        print("batch_q_learning/max_q_ratio {:.2f} is outside [{:.2f}, {:.2f}]".format(ratio, 1 / tolerance,
+                                                                                      tolerance))
+        failures.append("batch_q_learning/max_q_ratio")
+    return failures
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results against baseline ones. Values of correctness checks are skipped.
+    :param threshold: allowed relative slowdown, e.g. 0.1 for 10%
+    :return: list of names of regressed benchmarks
+    """
+    regressions = []
+    for name, base in baseline.items():
+        if name not in results or results[name]["higher_is_better"] is None:
+            continue
+        value = results[name]["value"]
+        if base["higher_is_better"]:
+            change = value / base["value"] - 1
+            regressed = change < -threshold
+        else:
+            change = base["value"] / value - 1
+            regressed = change < -threshold
+        print("{:<45} {:>+8.1%} {}".format(name, change, "REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run benchmark suite.")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative regression (default 0.1)")
+    parser.add_argument("--scale", type=float, default=1., help="multiplier of problem sizes (default 1)")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per benchmark, best is kept (default 3)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.scale, args.repeat)
+    failures = check(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "platform": platform.platform(),
+                    "scale": args.scale,
+                },
+                "results": results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
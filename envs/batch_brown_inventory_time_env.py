@@ -0,0 +1,137 @@
+import numpy as np
+
+from envs.base_env import BaseEnv
+from envs.components import INVENTORY_BINS, ExponentialFillModel, InventoryEncoder, InventoryTimeEncoder, fill_table
+from envs.utility import cara_utility, time_decay_table
+
+
+class BatchBrownInventoryTimeStateEnv(BaseEnv):
+    """
+    Batched version of BrownInventoryTimeStateEnv. Simulates n_envs independent episodes in lockstep, with inventory,
+    value and price of every episode held in NumPy arrays. Fill probabilities, rewards and the terminal penalty follow
+    the scalar environment exactly, only the random numbers are drawn for the whole batch at once.
+    """
+
+    # Inventory category for every inventory value in [-5, 5], same binning as the scalar environment
+    INVENTORY_BINS = INVENTORY_BINS
+
+    def __init__(self, n_envs, total_time, delta_t, process, a, b, rng=None, tick=0.1, bin_size=20, fill_intensity=140,
+                 fill_decay=-1.5, terminal_penalty=0.1, risk_aversion=None):
+        super(BatchBrownInventoryTimeStateEnv, self).__init__()
+
+        self.n_envs = n_envs
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        # Parameters used in reward function, see BrownInventoryTimeStateEnv
+        self.a = a
+        self.b = b
+        self.terminal_penalty = terminal_penalty
+        self.risk_aversion = risk_aversion
+        self.time_decay = time_decay_table(total_time, delta_t, b)
+
+        # Parameters related to price
+        self.tick = tick
+        self.value = np.full(n_envs, 1000.)
+        self.inventory = np.zeros(n_envs, dtype=np.int64)
+
+        # Parameters of execution probability, A * exp(-k * d) * delta_t for an order d ticks away
+        self.fill_intensity = fill_intensity
+        self.fill_decay = fill_decay
+
+        # Time parameters, shared by all episodes since they are simulated in lockstep
+        self.total_time = total_time
+        self.current_time = 0
+        self.delta_t = delta_t
+        self.time_left = self.total_time / self.delta_t
+
+        # To prevent state number explosion due to high number of temporal states
+        self.bin_size = bin_size
+
+        # Action and observation space, with fill probabilities of bid and ask of every action looked up from a table
+        self.action_space_size = 9
+        self.fill_model = ExponentialFillModel(fill_intensity, fill_decay)
+        self.fill_table = fill_table(self.fill_model, self.action_space_size, delta_t)
+        self.state_encoder = InventoryTimeEncoder(InventoryEncoder(), total_time, delta_t, bin_size)
+        self.observation_space_size = self.state_encoder.n_states
+
+        # Brownian stock price simulation data, one row per episode
+        self.process = process
+        self.data = self._generate_data()
+        self.iteration = 0
+        self.current_price = self.data[:, self.iteration]
+
+    def step(self, actions):
+        """
+        Execute one step of every episode in the batch.
+        :param actions: integer array of shape (n_envs,)
+        :return: arrays of next states, rewards, done flags, wealths and inventories
+        """
+
+        # Previous values needed for reward calculation
+        prev_inventory = self.inventory
+        prev_wealth = self._determine_wealth()
+
+        # Get distance (in ticks) from action
+        actions = np.asarray(actions)
+        d_bid = actions // 3
+        d_ask = actions % 3
+
+        # Based on action, look up bid/ask execution probability
+        p_bid, p_ask = self.fill_table[actions].T
+        u = self.rng.random((2, self.n_envs))
+        bid_filled = u[0] < p_bid
+        ask_filled = u[1] < p_ask
+        self.value = self.value \
+            - np.where(bid_filled, self.current_price - d_bid * self.tick, 0) \
+            + np.where(ask_filled, self.current_price + d_ask * self.tick, 0)
+        self.inventory = self.inventory + bid_filled - ask_filled
+
+        # Determine new state, reward
+        next_state = self.state_encoder.encode_batch(self.inventory, self.iteration)
+        reward = self.a * (self._determine_wealth() - prev_wealth) + \
+            np.copysign(self.time_decay[self.iteration], np.abs(self.inventory) - np.abs(prev_inventory))
+        done = self.total_time - self.delta_t <= self.current_time
+
+        # Increment counters
+        self.current_time += self.delta_t
+        self.iteration += 1
+        if not done:
+            self.current_price = self.data[:, self.iteration]
+        if done:
+            if self.risk_aversion is None:
+                # Same temporary terminal penalty as the scalar environment
+                r = self.terminal_penalty
+                reward = reward * np.exp(-r * np.abs(self.inventory))
+            else:
+                wealth = self._determine_wealth()
+                reward = reward + self.a * (cara_utility(wealth, self.risk_aversion, 1000) - (wealth - 1000))
+
+        self.time_left -= 1
+        return next_state, reward, np.full(self.n_envs, done), self._determine_wealth(), self.inventory
+
+    def reset(self):
+        self.value = np.full(self.n_envs, 1000.)
+        self.inventory = np.zeros(self.n_envs, dtype=np.int64)
+
+        self.current_time = 0
+        self.time_left = self.total_time / self.delta_t
+
+        self.data = self._generate_data()
+        self.iteration = 0
+        self.current_price = self.data[:, self.iteration]
+
+        return self.state_encoder.encode_batch(self.inventory, self.iteration)
+
+    def _generate_data(self):
+        """
+        Simulate one price series for every episode in the batch.
+        :return: Array of shape (n_envs, n_steps + 1)
+        """
+        return self.process.generate_batch(self.n_envs)
+
+    def _determine_wealth(self):
+        """
+        Calculate wealth using current money, inventory, and stock price.
+        :return: Current wealth of every episode
+        """
+        return self.value + self.inventory * self.current_price
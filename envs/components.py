@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+
+# Inventory category for every inventory value in [-5, 5]: 0 for no inventory, 1 to 3 for growing long and 4 to 6
+# for growing short positions
+INVENTORY_BINS = np.array([6, 5, 5, 4, 4, 0, 1, 1, 2, 2, 3])
+
+
+class ExponentialFillModel:
+    """
+    Order d ticks away from the price is filled within a step with probability intensity * exp(-decay * d) * delta_t.
+    """
+
+    def __init__(self, intensity=140, decay=-1.5):
+        self.intensity = intensity
+        self.decay = decay
+
+    def probability(self, distance, delta_t):
+        return self.intensity * math.exp(-self.decay * distance) * delta_t
+
+
+class LegacyFillModel:
+    """
+    Order d ticks away from the price is filled within a step with probability factor * exp(-d), regardless of the
+    length of the step.
+    """
+
+    # TODO ovaj dio je vjerojatno najlosije implementiran (najmanje u skladu s paperom) pa je prvi kandidat za promjenu
+    def __init__(self, factor=0.66):
+        self.factor = factor
+
+    def probability(self, distance, delta_t):
+        return math.exp(-distance) * self.factor
+
+
+def fill_table(fill_model, n_actions, delta_t):
+    """
+    Fill probabilities of bid and ask quotes of every action, action being 3 * d_bid + d_ask.
+    :return: Array of shape (n_actions, 2)
+    """
+    return np.array([[fill_model.probability(action // 3, delta_t), fill_model.probability(action % 3, delta_t)]
+                     for action in range(n_actions)])
+
+
+class InventoryEncoder:
+    """
+    State is the category of inventory, looked up from an array over inventories -max_inventory to max_inventory.
+    Larger inventories fall into the categories of the extremes.
+    """
+
+    def __init__(self, bins=INVENTORY_BINS):
+        self.bins = np.asarray(bins)
+        self.max_inventory = len(self.bins) // 2
+        self.n_states = int(self.bins.max()) + 1
+        self._bins = self.bins.tolist()
+
+    @classmethod
+    def from_edges(cls, edges, max_inventory):
+        """
+        Categories given by inventory edges, category i holding inventories in [edges[i - 1], edges[i]), as in
+        np.digitize. Finer grids cost no more per step than coarse ones.
+        """
+        return cls(np.digitize(np.arange(-max_inventory, max_inventory + 1), edges))
+
+    def encode(self, inventory, step):
+        m = self.max_inventory
+        return self._bins[min(max(inventory, -m), m) + m]
+
+    def encode_batch(self, inventory, step):
+        m = self.max_inventory
+        return self.bins[np.clip(inventory, -m, m) + m]
+
+
+class InventoryTimeEncoder:
+    """
+    State is made of inventory category and remaining time, in bins of bin_size steps. Time component of every step
+    is precomputed, the same way the environments used to count time left down.
+    """
+
+    def __init__(self, inventory_encoder, total_time, delta_t, bin_size=20):
+        self.inventory_encoder = inventory_encoder
+        self.bin_size = bin_size
+        n_inventory = inventory_encoder.n_states
+
+        time_left = total_time / delta_t
+        self.n_states = n_inventory * int(time_left // bin_size + 1)
+
+        self._time = []
+        for _ in range(int(math.ceil(time_left)) + 2):
+            self._time.append(int(time_left // bin_size) * n_inventory)
+            time_left -= 1
+        self.time_components = np.array(self._time)
+
+    def encode(self, inventory, step):
+        return self._time[step] + self.inventory_encoder.encode(inventory, step)
+
+    def encode_batch(self, inventory, step):
+        return self._time[step] + self.inventory_encoder.encode_batch(inventory, step)
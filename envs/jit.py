@@ -0,0 +1,12 @@
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit when numba is not installed, functions are left as plain Python."""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
@@ -0,0 +1,111 @@
+import math
+import random
+
+from envs.base_env import BaseEnv
+from envs.components import fill_table
+from envs.utility import cara_utility, time_decay_table
+
+
+class MarketMakingEnv(BaseEnv):
+    """
+    Common core of the environments using Brownian motion to model stock price. Agent quotes bid and ask d_bid and
+    d_ask ticks away from the price, action being 3 * d_bid + d_ask. Fill probabilities of every action come from a
+    fill model and states from a state encoder, both as lookup tables computed once.
+    """
+
+    def __init__(self, total_time, delta_t, process, a, b, fill_model, state_encoder, tick=0.1, terminal_penalty=0.1,
+                 risk_aversion=None):
+        super(MarketMakingEnv, self).__init__()
+
+        # Parameters used in reward function. Terminal reward is scaled by exp(-terminal_penalty * |inventory|), unless
+        # risk_aversion is given, in which case wealth is rewarded by its CARA utility.
+        self.a = a
+        self.b = b
+        self.terminal_penalty = terminal_penalty
+        self.risk_aversion = risk_aversion
+        self.time_decay = time_decay_table(total_time, delta_t, b).tolist()
+
+        # Parameters related to price
+        self.tick = tick
+        self.value = 1000
+        self.inventory = 0
+
+        # Time parameters
+        self.total_time = total_time
+        self.current_time = 0
+        self.delta_t = delta_t
+        self.time_left = self.total_time / self.delta_t
+
+        # Action and observation space
+        self.action_space_size = 9
+        self.fill_model = fill_model
+        self.fill_table = fill_table(fill_model, self.action_space_size, delta_t)
+        self._fill_table = self.fill_table.tolist()
+        self.state_encoder = state_encoder
+        self.observation_space_size = state_encoder.n_states
+
+        # Brownian stock price simulation data
+        self.process = process
+        self.data = self.process.generate_series()
+        self.iteration = 0
+        self.current_price = self.data[self.iteration]
+
+    def step(self, action):
+
+        # Previous values needed for reward calculation
+        prev_inventory = self.inventory
+        prev_wealth = self._determine_wealth()
+
+        # Get distance (in ticks) from action, and execution probabilities of bid and ask
+        d_bid = action // 3
+        d_ask = action % 3
+        p_bid, p_ask = self._fill_table[action]
+        if random.random() < p_bid:
+            self.value -= (self.current_price - d_bid * self.tick)
+            self.inventory += 1
+        if random.random() < p_ask:
+            self.value += (self.current_price + d_ask * self.tick)
+            self.inventory -= 1
+
+        # Determine new state, reward
+        next_state = self.state_encoder.encode(self.inventory, self.iteration)
+        reward = self.a * (self._determine_wealth() - prev_wealth) + \
+            math.copysign(self.time_decay[self.iteration], abs(self.inventory) - abs(prev_inventory))
+        done = self.total_time - self.delta_t <= self.current_time
+
+        # Increment counters
+        self.current_time += self.delta_t
+        self.iteration += 1
+        if not done:
+            self.current_price = self.data[self.iteration]
+        if done:
+            if self.risk_aversion is None:
+                # this is just a temporary basic implementation
+                reward = reward * math.exp(-self.terminal_penalty * abs(self.inventory))
+            else:
+                # Wealth terms of all rewards add up to a * (W_T - W_0), replace them by a * U(W_T)
+                wealth = self._determine_wealth()
+                reward += self.a * (float(cara_utility(wealth, self.risk_aversion, 1000)) - (wealth - 1000))
+
+        self.time_left -= 1
+        return next_state, reward, done, self._determine_wealth(), self.inventory
+
+    def reset(self):
+        self.value = 1000
+        self.inventory = 0
+
+        self.current_time = 0
+        self.time_left = self.total_time / self.delta_t
+
+        self.data = self.process.generate_series()
+        self.iteration = 0
+        self.current_price = self.data[self.iteration]
+
+        return self.state_encoder.encode(self.inventory, self.iteration)
+
+    def _determine_wealth(self):
+        """
+        Calculate wealth using current money, inventory, and stock price.
+        :return: Current wealth
+        """
+        return self.value + self.inventory * self.current_price
@@ -0,0 +1,372 @@
+import math
+
+import numpy as np
+
+from envs.base_env import BaseEnv
+from envs.components import InventoryEncoder, InventoryTimeEncoder
+from envs.jit import njit
+from envs.utility import cara_utility, time_decay_table
+
+# Number of random numbers drawn from the generator at once
+RANDOM_BLOCK = 65536
+
+# Most random numbers one event uses: time, type, side or level, and queue position
+RANDOM_PER_EVENT = 4
+
+# Integer state of the book, indices into OrderBookEnv.book
+BEST_BID = 0
+BEST_ASK = 1
+AGENT_BID = 2
+AGENT_ASK = 3
+AGENT_BID_AHEAD = 4
+AGENT_ASK_AHEAD = 5
+AGENT_BID_ACTIVE = 6
+AGENT_ASK_ACTIVE = 7
+INVENTORY = 8
+N_EVENTS = 9
+
+# Real-valued state of the book, indices into OrderBookEnv.cash
+ORIGIN = 0
+VALUE = 1
+CLOCK = 2
+
+
+class OrderBookEnv(BaseEnv):
+    """
+    This environment simulates a limit order book, following Cont and Stoikov (2010). Queue sizes of bid and ask price
+    levels are kept in arrays over a grid of prices. Limit orders arrive i ticks away from the opposite best quote at
+    rate limit_rate / i^limit_decay, market orders at market_rate, and every order i ticks away from the opposite best
+    quote is cancelled at rate cancel_rates[i - 1]. Arrivals are Poisson, so the next event is drawn from the total
+    rate of all of them and its type from their shares (Gillespie). Rates are per unit of time, multiplied by
+    rate_scale. The event loop is compiled with numba when it is installed.
+
+    The agent quotes one unit on both sides, d_bid ticks below best bid and d_ask ticks above best ask, and joins the
+    back of the queue at its price. Its orders are filled by market orders that reach them and by incoming limit
+    orders crossing them. States, actions and reward are the same as in BrownInventoryTimeStateEnv, with mid price
+    in place of the simulated stock price.
+    """
+
+    def __init__(self, total_time, delta_t, a, b, tick=0.1, initial_price=100, limit_rate=1.92, limit_decay=0.52,
+                 market_rate=0.94, cancel_rates=(0.71, 0.81, 0.68, 0.56, 0.47), rate_scale=1000, bin_size=20,
+                 terminal_penalty=0.1, risk_aversion=None, n_prices=1000, rng=None):
+        super(OrderBookEnv, self).__init__()
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        # Parameters used in reward function, see BrownInventoryTimeStateEnv
+        self.a = a
+        self.b = b
+        self.terminal_penalty = terminal_penalty
+        self.risk_aversion = risk_aversion
+        self.time_decay = time_decay_table(total_time, delta_t, b).tolist()
+
+        # Parameters related to price
+        self.tick = tick
+        self.initial_price = initial_price
+        self.n_prices = n_prices
+
+        # Order flow parameters, for distances 1 to n_levels from the opposite best quote
+        self.n_levels = len(cancel_rates)
+        self.limit_rates = rate_scale * limit_rate / np.arange(1, self.n_levels + 1) ** limit_decay
+        self.cancel_rates = rate_scale * np.asarray(cancel_rates, dtype=float)
+        self.market_rate = rate_scale * market_rate
+        self.limit_cdf = np.cumsum(self.limit_rates) / self.limit_rates.sum()
+
+        # Time parameters
+        self.total_time = total_time
+        self.current_time = 0
+        self.delta_t = delta_t
+        self.time_left = self.total_time / self.delta_t
+        self.iteration = 0
+
+        # To prevent state number explosion due to high number of temporal states
+        self.bin_size = bin_size
+
+        # Action and observation space, states encoded the same way as in BrownInventoryTimeStateEnv
+        self.state_encoder = InventoryTimeEncoder(InventoryEncoder(), total_time, delta_t, bin_size)
+        self.observation_space_size = self.state_encoder.n_states
+        self.action_space_size = 9
+
+        self._uniform = self.rng.random(RANDOM_BLOCK)
+        self._position = 0
+        self._reset_book()
+        self.current_price = self._mid_price()
+
+    @property
+    def value(self):
+        return self.cash[VALUE]
+
+    @property
+    def inventory(self):
+        return int(self.book[INVENTORY])
+
+    @property
+    def best_bid(self):
+        return int(self.book[BEST_BID])
+
+    @property
+    def best_ask(self):
+        return int(self.book[BEST_ASK])
+
+    @property
+    def n_events(self):
+        """Number of order book events simulated by this environment."""
+        return int(self.book[N_EVENTS])
+
+    def step(self, action):
+
+        # Previous values needed for reward calculation
+        prev_inventory = self.inventory
+        prev_wealth = self._determine_wealth()
+
+        # Get distance (in ticks) from action, and place quotes. Orders at unchanged prices keep their place in queue.
+        book = self.book
+        d_bid = action // 3
+        d_ask = action % 3
+        bid_price = book[BEST_BID] - d_bid
+        if bid_price != book[AGENT_BID] or not book[AGENT_BID_ACTIVE]:
+            book[AGENT_BID] = bid_price
+            book[AGENT_BID_AHEAD] = self.bids[bid_price]
+        ask_price = book[BEST_ASK] + d_ask
+        if ask_price != book[AGENT_ASK] or not book[AGENT_ASK_ACTIVE]:
+            book[AGENT_ASK] = ask_price
+            book[AGENT_ASK_AHEAD] = self.asks[ask_price]
+        book[AGENT_BID_ACTIVE] = 1
+        book[AGENT_ASK_ACTIVE] = 1
+
+        # Order flow until the end of the step fills the agent's quotes
+        self._simulate(self.cash[CLOCK] + self.delta_t)
+        self.current_price = self._mid_price()
+
+        # Determine new state, reward
+        inventory = self.inventory
+        next_state = self.state_encoder.encode(inventory, self.iteration)
+        reward = self.a * (self._determine_wealth() - prev_wealth) + \
+            math.copysign(self.time_decay[self.iteration], abs(inventory) - abs(prev_inventory))
+        done = self.total_time - self.delta_t <= self.current_time
+
+        # Increment counters
+        self.current_time += self.delta_t
+        self.iteration += 1
+        if done:
+            if self.risk_aversion is None:
+                reward = reward * math.exp(-self.terminal_penalty * abs(inventory))
+            else:
+                wealth = self._determine_wealth()
+                reward += self.a * (float(cara_utility(wealth, self.risk_aversion, 1000)) - (wealth - 1000))
+
+        self.time_left -= 1
+        return next_state, reward, done, self._determine_wealth(), inventory
+
+    def reset(self):
+        self.current_time = 0
+        self.time_left = self.total_time / self.delta_t
+        self.iteration = 0
+
+        self._reset_book()
+        self.current_price = self._mid_price()
+
+        return self.state_encoder.encode(self.inventory, self.iteration)
+
+    def _reset_book(self):
+        """
+        Fill levels near the spread with their mean queue sizes, limit rate / cancel rate. Event count is kept.
+        """
+        n_events = self.book[N_EVENTS] if hasattr(self, "book") else 0
+        self.bids = np.zeros(self.n_prices, dtype=np.int64)
+        self.asks = np.zeros(self.n_prices, dtype=np.int64)
+        center = self.n_prices // 2
+        depth = np.maximum(1, np.round(self.limit_rates / self.cancel_rates)).astype(np.int64)
+        self.bids[center - self.n_levels + 1:center + 1] = depth[::-1]
+        self.asks[center + 1:center + 1 + self.n_levels] = depth
+
+        self.book = np.zeros(10, dtype=np.int64)
+        self.book[BEST_BID] = center
+        self.book[BEST_ASK] = center + 1
+        self.book[AGENT_BID] = self.book[AGENT_ASK] = -1
+        self.book[N_EVENTS] = n_events
+
+        # Price of grid level 0, so that initial mid price is initial_price. Wealth starts at 1000.
+        self.cash = np.array([self.initial_price - (center + 0.5) * self.tick, 1000., 0.])
+
+    def _simulate(self, until):
+        """
+        Process events until given time, in the compiled loop. It returns early when it runs out of random numbers,
+        which are then drawn anew.
+        """
+        while True:
+            self._position = _simulate_events(self.bids, self.asks, self.book, self.cash, until, self._uniform,
+                                              self._position, self.limit_rates, self.limit_cdf, self.cancel_rates,
+                                              self.market_rate, self.tick)
+            if self._position >= 0:
+                return
+            self._uniform = self.rng.random(RANDOM_BLOCK)
+            self._position = 0
+
+    def _mid_price(self):
+        return self.cash[ORIGIN] + (self.book[BEST_BID] + self.book[BEST_ASK]) / 2 * self.tick
+
+    def _determine_wealth(self):
+        """
+        Calculate wealth using current money, inventory, and mid price.
+        :return: Current wealth
+        """
+        return self.cash[VALUE] + self.book[INVENTORY] * self.current_price
+
+
+@njit(cache=True)
+def _simulate_events(bids, asks, book, cash, until, uniform, position, limit_rates, limit_cdf, cancel_rates,
+                     market_rate, tick):
+    """
+    Process events in order of time, until given time. Book arrays are updated in place.
+    :return: position of the next unused random number, or -1 if they ran out before until was reached
+    """
+    n_levels = len(cancel_rates)
+    n_prices = len(bids)
+    limit_total = 2 * limit_rates.sum()
+    market_total = 2 * market_rate
+
+    while True:
+        if position + RANDOM_PER_EVENT > len(uniform):
+            return -1
+
+        # Total rate of cancellations of orders within n_levels of the opposite best quote
+        cancel_total = 0.
+        for i in range(1, n_levels + 1):
+            cancel_total += cancel_rates[i - 1] * (bids[book[BEST_ASK] - i] + asks[book[BEST_BID] + i])
+
+        # Time of the next event, arrivals being memoryless one after until is simply not simulated
+        total = limit_total + market_total + cancel_total
+        clock = cash[CLOCK] - math.log(1. - uniform[position]) / total
+        if clock >= until:
+            cash[CLOCK] = until
+            return position + 1
+        cash[CLOCK] = clock
+
+        kind = uniform[position + 1] * total
+        side = uniform[position + 2]
+        u = uniform[position + 3]
+        position += RANDOM_PER_EVENT
+
+        if kind < limit_total:
+            i = np.searchsorted(limit_cdf, u, side="right") + 1
+            if side < 0.5:
+                price = book[BEST_ASK] - i
+                if book[AGENT_ASK_ACTIVE] and price >= book[AGENT_ASK]:
+                    _fill_ask(book, cash, tick)
+                else:
+                    bids[price] += 1
+                    if price > book[BEST_BID]:
+                        book[BEST_BID] = price
+            else:
+                price = book[BEST_BID] + i
+                if book[AGENT_BID_ACTIVE] and price <= book[AGENT_BID]:
+                    _fill_bid(book, cash, tick)
+                else:
+                    asks[price] += 1
+                    if price < book[BEST_ASK]:
+                        book[BEST_ASK] = price
+        elif kind < limit_total + market_total:
+            if side < 0.5:
+                # Sell order, hits the best bid
+                if book[AGENT_BID_ACTIVE] and book[AGENT_BID] >= book[BEST_BID] and \
+                        (book[AGENT_BID] > book[BEST_BID] or book[AGENT_BID_AHEAD] == 0):
+                    _fill_bid(book, cash, tick)
+                else:
+                    if book[AGENT_BID_ACTIVE] and book[AGENT_BID] == book[BEST_BID]:
+                        book[AGENT_BID_AHEAD] -= 1
+                    _remove_bid(bids, book, book[BEST_BID])
+            else:
+                # Buy order, hits the best ask
+                if book[AGENT_ASK_ACTIVE] and book[AGENT_ASK] <= book[BEST_ASK] and \
+                        (book[AGENT_ASK] < book[BEST_ASK] or book[AGENT_ASK_AHEAD] == 0):
+                    _fill_ask(book, cash, tick)
+                else:
+                    if book[AGENT_ASK_ACTIVE] and book[AGENT_ASK] == book[BEST_ASK]:
+                        book[AGENT_ASK_AHEAD] -= 1
+                    _remove_ask(asks, book, book[BEST_ASK])
+        else:
+            # Pick a level with probability proportional to its cancellation rate
+            target = side * cancel_total
+            for i in range(1, n_levels + 1):
+                price = book[BEST_ASK] - i
+                target -= cancel_rates[i - 1] * bids[price]
+                if target < 0:
+                    if price == book[AGENT_BID] and u * bids[price] < book[AGENT_BID_AHEAD]:
+                        book[AGENT_BID_AHEAD] -= 1
+                    _remove_bid(bids, book, price)
+                    break
+                price = book[BEST_BID] + i
+                target -= cancel_rates[i - 1] * asks[price]
+                if target < 0:
+                    if price == book[AGENT_ASK] and u * asks[price] < book[AGENT_ASK_AHEAD]:
+                        book[AGENT_ASK_AHEAD] -= 1
+                    _remove_ask(asks, book, price)
+                    break
+
+        book[N_EVENTS] += 1
+        if book[BEST_BID] < n_levels + 2 or book[BEST_ASK] > n_prices - n_levels - 3:
+            _recenter(bids, asks, book, cash, tick)
+
+
+@njit(cache=True)
+def _remove_bid(bids, book, price):
+    bids[price] -= 1
+    if price == book[BEST_BID] and bids[price] == 0:
+        while price > 0 and bids[price] == 0:
+            price -= 1
+        if bids[price] == 0:
+            # Whole side was consumed, replenish it just below the ask
+            price = book[BEST_ASK] - 1
+            bids[price] = 1
+        book[BEST_BID] = price
+
+
+@njit(cache=True)
+def _remove_ask(asks, book, price):
+    asks[price] -= 1
+    if price == book[BEST_ASK] and asks[price] == 0:
+        while price < len(asks) - 1 and asks[price] == 0:
+            price += 1
+        if asks[price] == 0:
+            # Whole side was consumed, replenish it just above the bid
+            price = book[BEST_BID] + 1
+            asks[price] = 1
+        book[BEST_ASK] = price
+
+
+@njit(cache=True)
+def _fill_bid(book, cash, tick):
+    cash[VALUE] -= cash[ORIGIN] + book[AGENT_BID] * tick
+    book[INVENTORY] += 1
+    book[AGENT_BID_ACTIVE] = 0
+
+
+@njit(cache=True)
+def _fill_ask(book, cash, tick):
+    cash[VALUE] += cash[ORIGIN] + book[AGENT_ASK] * tick
+    book[INVENTORY] -= 1
+    book[AGENT_ASK_ACTIVE] = 0
+
+
+@njit(cache=True)
+def _recenter(bids, asks, book, cash, tick):
+    """
+    Shift the price grid so that the spread is in its middle again. Orders pushed off the grid are dropped.
+    """
+    n_prices = len(bids)
+    shift = (book[BEST_BID] + book[BEST_ASK]) // 2 - n_prices // 2
+    if shift > 0:
+        bids[:n_prices - shift] = bids[shift:].copy()
+        asks[:n_prices - shift] = asks[shift:].copy()
+        bids[n_prices - shift:] = 0
+        asks[n_prices - shift:] = 0
+    elif shift < 0:
+        bids[-shift:] = bids[:n_prices + shift].copy()
+        asks[-shift:] = asks[:n_prices + shift].copy()
+        bids[:-shift] = 0
+        asks[:-shift] = 0
+    book[BEST_BID] -= shift
+    book[BEST_ASK] -= shift
+    book[AGENT_BID] -= shift
+    book[AGENT_ASK] -= shift
+    cash[ORIGIN] += shift * tick
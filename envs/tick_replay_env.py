@@ -0,0 +1,22 @@
+from envs.brown_inventory_time_env import BrownInventoryTimeStateEnv
+from models.tick_data import TickData
+
+
+class TickReplayEnv(BrownInventoryTimeStateEnv):
+    """
+    This environment replays recorded market prices instead of simulating them. Every episode is a random window of
+    total_time / delta_t consecutive ticks of a file written by models.tick_data.ingest, read through a memory map.
+    States, actions, fills and reward are the same as in BrownInventoryTimeStateEnv.
+    """
+
+    def __init__(self, data, total_time, delta_t, a, b, rng=None, **kwargs):
+        """
+        :param data: TickData, or filename of an ingested binary file
+        :param rng: source of window starts, see TickWindows
+        :param kwargs: other parameters of BrownInventoryTimeStateEnv
+        """
+        if not isinstance(data, TickData):
+            data = TickData(data)
+        self.tick_data = data
+        process = data.windows(int(total_time / delta_t), rng)
+        super(TickReplayEnv, self).__init__(total_time, delta_t, process, a, b, **kwargs)
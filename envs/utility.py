@@ -0,0 +1,47 @@
+import numpy as np
+
+# Largest exponent of CARA utility, exp(MAX_EXPONENT) / risk_aversion stays finite for any realistic risk aversion
+MAX_EXPONENT = 500.
+
+
+def cara_utility(wealth, risk_aversion, reference_wealth=0):
+    """
+    CARA (exponential) utility -exp(-risk_aversion * wealth), normalized by the utility of reference_wealth and
+    expressed in units of money: (1 - exp(-risk_aversion * (wealth - reference_wealth))) / risk_aversion.
+    The normalization is done in log-space, before exponentiating, so the extreme magnitudes of exp(-gamma * W) for
+    realistic wealths never appear, and the exponent is capped at MAX_EXPONENT, so large losses give a very negative
+    but finite utility. Risk aversion of 0 gives the risk neutral limit wealth - reference_wealth. Works elementwise
+    on arrays.
+    """
+    if risk_aversion < 0:
+        raise ValueError("Risk aversion must not be negative: {}".format(risk_aversion))
+    difference = np.asarray(wealth) - reference_wealth
+    if risk_aversion == 0:
+        return difference * 1.
+    return -np.expm1(np.minimum(-risk_aversion * difference, MAX_EXPONENT)) / risk_aversion
+
+
+def certainty_equivalent(wealth, risk_aversion, axis=None):
+    """
+    Certainty equivalent of a sample of wealths under CARA utility, -log(mean(exp(-risk_aversion * W))) / risk_aversion,
+    computed with the log-sum-exp trick so it neither overflows nor underflows. Risk aversion of 0 gives the mean.
+    :param wealth: array of wealths, e.g. final wealths of a batch of episodes
+    :param axis: axis to reduce, all if None
+    """
+    if risk_aversion < 0:
+        raise ValueError("Risk aversion must not be negative: {}".format(risk_aversion))
+    if risk_aversion == 0:
+        mean = np.mean(wealth, axis=axis)
+        return float(mean) if axis is None else mean
+    x = -risk_aversion * np.asarray(wealth, dtype=float)
+    x_max = np.max(x, axis=axis, keepdims=True)
+    log_mean = np.log(np.mean(np.exp(x - x_max), axis=axis, keepdims=True)) + x_max
+    return -np.squeeze(log_mean, axis=axis) / risk_aversion if axis is not None else -log_mean.item() / risk_aversion
+
+
+def time_decay_table(total_time, delta_t, b):
+    """
+    Inventory term exp(b * (T - t)) of the reward for every step t = k * delta_t, computed once instead of every step.
+    :return: Array indexed by step number k
+    """
+    return np.exp(b * (total_time - np.arange(int(np.ceil(total_time / delta_t)) + 1) * delta_t))
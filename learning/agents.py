@@ -1,10 +1,12 @@
 import itertools
-import sys
-from collections import defaultdict
+import time
 
 import numpy as np
 
-from plotting.plot_utils import EpisodeStats
+from learning.checkpoint import capture, load_checkpoint, recorder_state, restore, restore_recorder
+from learning.instrumentation import ProgressPrinter
+from learning.q_table import QTable
+from learning.recorder import MemoryRecorder
 
 
 def make_epsilon_greedy_policy(Q, epsilon, nA):
@@ -21,138 +23,510 @@ def make_epsilon_greedy_policy(Q, epsilon, nA):
     return policy_fn
 
 
-def q_learning(env, num_episodes, discount_factor=0.9, alpha=0.5, epsilon=0.1):
+def exponential_decay(initial, final=0., half_life=1000):
+    """
+    Schedule decaying from initial towards final, halving the distance every half_life episodes. Can be passed as
+    alpha or epsilon of the learning agents.
+    :return: function of episode index
+    """
+    return lambda episode: final + (initial - final) * 0.5 ** (episode / half_life)
+
+
+def harmonic_decay(initial, scale=1000):
+    """
+    Schedule initial * scale / (scale + episode). Used as alpha, its sum diverges and sum of its squares converges,
+    as tabular convergence proofs require.
+    :return: function of episode index
+    """
+    return lambda episode: initial * scale / (scale + episode)
+
+
+def _scheduled(value, episode):
+    """
+    Value of a parameter in given episode, parameter being either a constant or a schedule.
+    """
+    return value(episode) if callable(value) else value
+
+
+def q_learning(env, num_episodes, discount_factor=0.9, alpha=0.5, epsilon=0.1, engine="python", progress=None,
+               profiler=None, recorder=None, checkpoint=None, resume=None, initial_q=None):
     """
     Q-Learning algorithm: Off-policy TD control. Finds the optimal greedy policy
     while following an epsilon-greedy policy
+    :param alpha: learning rate, constant or schedule such as harmonic_decay()
+    :param epsilon: exploration rate, constant or schedule such as exponential_decay()
+    :param engine: "python" for this reference implementation, "compiled" to run whole episodes of a
+    BrownInventoryTimeStateEnv in one numba-compiled function (learning.compiled)
+    :param progress: callback taking (episode, num_episodes), rate-limited ProgressPrinter if None
+    :param profiler: optional learning.instrumentation.Profiler
+    :param recorder: where statistics are recorded, learning.recorder.MemoryRecorder if None
+    :param checkpoint: optional learning.checkpoint.Checkpointer, also given the state after the last episode
+    :param resume: Checkpoint, or filename of one, to continue from. Continuing produces the same results as an
+    uninterrupted run, and num_episodes may be larger than in the run that wrote it.
+    :param initial_q: QTable or array to start from instead of zeros, e.g. learning.dynamic_programming.to_q_table
+    """
+    if engine == "compiled":
+        if checkpoint is not None or resume is not None:
+            raise ValueError("Checkpoints are not supported by the compiled engine")
+        if callable(alpha) or callable(epsilon):
+            raise ValueError("Schedules are not supported by the compiled engine")
+        from learning import compiled
+        return compiled.q_learning(env, num_episodes, discount_factor, alpha, epsilon, progress=progress,
+                                   profiler=profiler, recorder=recorder, initial_q=initial_q)
+    elif engine != "python":
+        raise ValueError("Unknown engine: {}".format(engine))
+
+    # A dense table that maps state -> (action -> action-value).
+    Q = QTable.for_env(env)
+    if initial_q is not None:
+        Q.values[:] = np.asarray(initial_q)
+
+    # Keeps track of useful statistics
+    recorder = recorder or MemoryRecorder()
+
+    # Continue with table, statistics and random states of a checkpoint, recorder continues in place of beginning
+    start_episode = 0
+    if resume is not None:
+        resume = load_checkpoint(resume) if isinstance(resume, str) else resume
+        Q.values[:] = resume.q_values
+        restore_recorder(recorder, "Q-learning", num_episodes, resume.recorder_state)
+        restore(resume, env)
+        start_episode = resume.episode
+    else:
+        recorder.begin("Q-learning", num_episodes)
+
+    if checkpoint is not None:
+        # Reject recorders that cannot be checkpointed before training, not at the first checkpoint
+        recorder_state(recorder)
+
+    progress = progress or ProgressPrinter()
+
+    for i_episode in range(start_episode, num_episodes):
+        progress(i_episode + 1, num_episodes)
+        timed = profiler is not None and profiler.sample(i_episode)
+        episode_alpha = _scheduled(alpha, i_episode)
+        episode_epsilon = _scheduled(epsilon, i_episode)
+
+        # Reset the environment and pick the first action
+        state = env.reset()
+        episode_reward = 0
+        episode_inventory = 0
+
+        # Step through the environment until finished
+        for t in itertools.count():
+
+            if timed:
+                t0 = time.perf_counter()
+
+            # Take a step, following epsilon-greedy policy
+            action = Q.epsilon_greedy(state, episode_epsilon)
+            if timed:
+                t1 = time.perf_counter()
+            next_state, reward, done, w, i = env.step(action)
+            if timed:
+                t2 = time.perf_counter()
+
+            # Update statistics
+            episode_reward += reward
+            episode_inventory += abs(i)
+            if recorder.record_steps:
+                recorder.record_step(i_episode, t, action, env.current_price, reward, w, i)
+            if timed:
+                t3 = time.perf_counter()
+
+            # TD Update
+            best_next_action = Q.greedy(next_state)
+            td_target = reward + discount_factor * Q.values[next_state, best_next_action]
+            td_delta = td_target - Q.values[state, action]
+            Q.values[state, action] += episode_alpha * td_delta
+            if timed:
+                profiler.record_step(t1 - t0, t2 - t1, t3 - t2, time.perf_counter() - t3)
+
+            if done:
+                recorder.record_episode(t, episode_reward, w, episode_inventory / t)
+                if profiler is not None:
+                    profiler.record_episode(t + 1)
+                break
+
+            state = next_state
+
+        if checkpoint is not None and (checkpoint.due(i_episode + 1) or i_episode + 1 == num_episodes):
+            checkpoint.submit(capture(i_episode + 1, Q, recorder, env))
+
+    return Q, recorder.episode_stats()
+
+
+def q_lambda(env, num_episodes, discount_factor=0.9, alpha=0.5, epsilon=0.1, trace_decay=0.9, trace_threshold=1e-3,
+             progress=None, profiler=None, recorder=None, initial_q=None):
+    """
+    Watkins's Q(lambda): Q-learning with eligibility traces, so that every TD error also updates the state-action
+    pairs visited earlier in the episode, not only the last one. Traces are replacing and kept sparse, in a dictionary
+    of visited pairs: they decay by discount_factor * trace_decay every step, are dropped once below trace_threshold,
+    and are all cut after an exploratory action.
+    :param alpha: learning rate, constant or schedule such as harmonic_decay()
+    :param epsilon: exploration rate, constant or schedule such as exponential_decay()
+    :param trace_decay: lambda, 0 gives one-step Q-learning
+    :param progress: callback taking (episode, num_episodes), rate-limited ProgressPrinter if None
+    :param profiler: optional learning.instrumentation.Profiler
+    :param recorder: where statistics are recorded, learning.recorder.MemoryRecorder if None
+    :param initial_q: QTable or array to start from instead of zeros
     """
 
-    # A nested dictionary that maps state -> (action -> action-value).
-    Q = defaultdict(lambda: np.zeros(env.action_space_size))
+    # A dense table that maps state -> (action -> action-value).
+    Q = QTable.for_env(env)
+    if initial_q is not None:
+        Q.values[:] = np.asarray(initial_q)
 
     # Keeps track of useful statistics
-    stats = EpisodeStats("Q-learning",
-                         episode_lengths=np.zeros(num_episodes),
-                         episode_rewards=np.zeros(num_episodes),
-                         episode_profits=np.zeros(num_episodes),
-                         episode_inventory=np.zeros(num_episodes))
+    recorder = recorder or MemoryRecorder()
+    recorder.begin("Q(lambda)", num_episodes)
 
-    # The policy we're following
-    policy = make_epsilon_greedy_policy(Q, epsilon, env.action_space_size)
+    progress = progress or ProgressPrinter()
+    decay = discount_factor * trace_decay
 
     for i_episode in range(num_episodes):
-        if (i_episode + 1) % 10 == 0:
-            print("\rEpisode {}/{}.".format(i_episode + 1, num_episodes), end="")
-            sys.stdout.flush()
+        progress(i_episode + 1, num_episodes)
+        timed = profiler is not None and profiler.sample(i_episode)
+        episode_alpha = _scheduled(alpha, i_episode)
+        episode_epsilon = _scheduled(epsilon, i_episode)
 
         # Reset the environment and pick the first action
         state = env.reset()
+        action = Q.epsilon_greedy(state, episode_epsilon)
+        traces = {}
+        episode_reward = 0
+        episode_inventory = 0
 
         # Step through the environment until finished
         for t in itertools.count():
 
-            # Take a step
-            action_probs = policy(state)
-            action = np.random.choice(np.arange(len(action_probs)), p=action_probs)
+            if timed:
+                t0 = time.perf_counter()
+
+            # Take a step, and pick the next action following epsilon-greedy policy
             next_state, reward, done, w, i = env.step(action)
+            if timed:
+                t1 = time.perf_counter()
+            next_action = Q.epsilon_greedy(next_state, episode_epsilon)
+            if timed:
+                t2 = time.perf_counter()
 
             # Update statistics
-            stats.episode_rewards[i_episode] += reward
-            stats.episode_lengths[i_episode] = t
-            stats.episode_profits[i_episode] = w
-            stats.episode_inventory[i_episode] += abs(i)
-
-            # TD Update
-            best_next_action = np.argmax(Q[next_state])
-            td_target = reward + discount_factor * Q[next_state][best_next_action]
-            td_delta = td_target - Q[state][action]
-            Q[state][action] += alpha * td_delta
+            episode_reward += reward
+            episode_inventory += abs(i)
+            if recorder.record_steps:
+                recorder.record_step(i_episode, t, action, env.current_price, reward, w, i)
+            if timed:
+                t3 = time.perf_counter()
+
+            # TD Update of every pair with a trace. Ties with the greedy action count as greedy.
+            best_next_action = Q.greedy(next_state)
+            if Q.values[next_state, next_action] == Q.values[next_state, best_next_action]:
+                best_next_action = next_action
+            td_target = reward + discount_factor * Q.values[next_state, best_next_action]
+            td_delta = td_target - Q.values[state, action]
+            traces[state, action] = 1.
+            step = episode_alpha * td_delta
+            for pair, trace in traces.items():
+                Q.values[pair] += step * trace
+
+            # Traces of a greedy policy continue, exploration cuts them
+            if next_action == best_next_action:
+                traces = {pair: trace * decay for pair, trace in traces.items() if trace * decay >= trace_threshold}
+            else:
+                traces = {}
+            if timed:
+                profiler.record_step(t2 - t1, t1 - t0, t3 - t2, time.perf_counter() - t3)
 
             if done:
-                stats.episode_inventory[i_episode] /= t
+                recorder.record_episode(t, episode_reward, w, episode_inventory / t)
+                if profiler is not None:
+                    profiler.record_episode(t + 1)
                 break
 
             state = next_state
+            action = next_action
 
-    return Q, stats
+    return Q, recorder.episode_stats()
 
 
-def random_actions(env, num_episodes):
+def double_q_learning(env, num_episodes, discount_factor=0.9, alpha=0.5, epsilon=0.1, progress=None, profiler=None,
+                      recorder=None, initial_q=None):
     """
-    This agent takes random actions for each step of the way. No learning is present, so returning value function
-    results in None.
+    Double Q-learning: two tables, each updated on half of the steps with the action greedy in itself but valued by
+    the other one. This removes the overestimation of noisy action values that max of a single table causes.
+    Actions are epsilon-greedy in the mean of both tables, which is also the returned table.
+    :param alpha: learning rate, constant or schedule such as harmonic_decay()
+    :param epsilon: exploration rate, constant or schedule such as exponential_decay()
+    :param progress: callback taking (episode, num_episodes), rate-limited ProgressPrinter if None
+    :param profiler: optional learning.instrumentation.Profiler
+    :param recorder: where statistics are recorded, learning.recorder.MemoryRecorder if None
+    :param initial_q: QTable or array both tables start from instead of zeros
     """
 
+    # Mean of both tables, used for acting
+    Q = QTable.for_env(env)
+    if initial_q is not None:
+        Q.values[:] = np.asarray(initial_q)
+    tables = (Q.values.copy(), Q.values.copy())
+
     # Keeps track of useful statistics
-    stats = EpisodeStats("Random actions",
-                         episode_lengths=np.zeros(num_episodes),
-                         episode_rewards=np.zeros(num_episodes),
-                         episode_profits=np.zeros(num_episodes),
-                         episode_inventory=np.zeros(num_episodes))
+    recorder = recorder or MemoryRecorder()
+    recorder.begin("Double Q-learning", num_episodes)
+
+    progress = progress or ProgressPrinter()
 
     for i_episode in range(num_episodes):
-        if (i_episode + 1) % 10 == 0:
-            print("\rEpisode {}/{}.".format(i_episode + 1, num_episodes), end="")
-            sys.stdout.flush()
+        progress(i_episode + 1, num_episodes)
+        timed = profiler is not None and profiler.sample(i_episode)
+        episode_alpha = _scheduled(alpha, i_episode)
+        episode_epsilon = _scheduled(epsilon, i_episode)
 
         # Reset the environment and pick the first action
-        env.reset()
+        state = env.reset()
+        episode_reward = 0
+        episode_inventory = 0
 
         # Step through the environment until finished
         for t in itertools.count():
 
-            # Take a random step
-            action = np.random.choice(np.arange(env.action_space_size))
+            if timed:
+                t0 = time.perf_counter()
+
+            # Take a step, following epsilon-greedy policy
+            action = Q.epsilon_greedy(state, episode_epsilon)
+            if timed:
+                t1 = time.perf_counter()
             next_state, reward, done, w, i = env.step(action)
+            if timed:
+                t2 = time.perf_counter()
 
             # Update statistics
-            stats.episode_rewards[i_episode] += reward
-            stats.episode_lengths[i_episode] = t
-            stats.episode_profits[i_episode] = w
-            stats.episode_inventory[i_episode] += abs(i)
+            episode_reward += reward
+            episode_inventory += abs(i)
+            if recorder.record_steps:
+                recorder.record_step(i_episode, t, action, env.current_price, reward, w, i)
+            if timed:
+                t3 = time.perf_counter()
+
+            # TD Update of a randomly chosen table, next action valued by the other one
+            first = np.random.random() < 0.5
+            updated, other = tables if first else tables[::-1]
+            best_next_action = updated[next_state].argmax()
+            td_target = reward + discount_factor * other[next_state, best_next_action]
+            updated[state, action] += episode_alpha * (td_target - updated[state, action])
+            Q.values[state, action] = (tables[0][state, action] + tables[1][state, action]) / 2
+            if timed:
+                profiler.record_step(t1 - t0, t2 - t1, t3 - t2, time.perf_counter() - t3)
 
             if done:
-                stats.episode_inventory[i_episode] /= t
+                recorder.record_episode(t, episode_reward, w, episode_inventory / t)
+                if profiler is not None:
+                    profiler.record_episode(t + 1)
                 break
 
-    return None, stats
+            state = next_state
+
+    return Q, recorder.episode_stats()
 
 
-def zero_tick(env, num_episodes):
+def batch_q_learning(env, num_episodes, discount_factor=0.9, alpha=0.5, epsilon=0.1, progress=None, profiler=None,
+                     recorder=None):
+    """
+    Synchronous Q-Learning on a BatchBrownInventoryTimeStateEnv. All episodes of a batch are stepped in lockstep and
+    their TD updates are scattered into the shared Q-table at once. Updates of the same state-action pair within one
+    step are all computed from its value before that step, and their mean is applied, so the step size does not grow
+    with the number of episodes visiting the pair.
+    :param progress: callback taking (episode, num_episodes), rate-limited ProgressPrinter if None
+    :param profiler: optional learning.instrumentation.Profiler, sampling is done per batch
+    :param recorder: where statistics are recorded, learning.recorder.MemoryRecorder if None
+    """
+
+    # A dense table that maps state -> (action -> action-value).
+    Q = QTable.for_env(env)
+
+    # Keeps track of useful statistics
+    recorder = recorder or MemoryRecorder()
+    recorder.begin("Q-learning", num_episodes)
+
+    progress = progress or ProgressPrinter()
+
+    for first_episode in range(0, num_episodes, env.n_envs):
+        timed = profiler is not None and profiler.sample(first_episode // env.n_envs)
+
+        # Last batch may need fewer episodes than the environment simulates, the rest do not learn nor get recorded
+        n = min(env.n_envs, num_episodes - first_episode)
+        episodes = np.arange(first_episode, first_episode + n)
+        episode_rewards = np.zeros(n)
+        episode_inventory = np.zeros(n)
+
+        # Reset the environment and pick the first actions
+        state = env.reset()
+
+        # Step through the environment until finished
+        for t in itertools.count():
+
+            if timed:
+                t0 = time.perf_counter()
+
+            # Take a step, following epsilon-greedy policy
+            action = Q.values[state].argmax(axis=1)
+            explore = env.rng.random(env.n_envs) < epsilon
+            action[explore] = env.rng.integers(0, env.action_space_size, np.count_nonzero(explore))
+            if timed:
+                t1 = time.perf_counter()
+            next_state, reward, done, w, i = env.step(action)
+            if timed:
+                t2 = time.perf_counter()
+
+            # Update statistics
+            episode_rewards += reward[:n]
+            episode_inventory += np.abs(i[:n])
+            if recorder.record_steps:
+                recorder.record_steps_batch(episodes, t, action[:n], env.current_price[:n], reward[:n], w[:n], i[:n])
+            if timed:
+                t3 = time.perf_counter()
+
+            # TD Update
+            s, a, s_next = state[:n], action[:n], next_state[:n]
+            td_target = reward[:n] + discount_factor * Q.values[s_next].max(axis=1)
+            td_delta = td_target - Q.values[s, a]
+            pairs = s * Q.n_actions + a
+            counts = np.bincount(pairs, minlength=Q.values.size)
+            sums = np.bincount(pairs, weights=td_delta, minlength=Q.values.size)
+            visited = np.flatnonzero(counts)
+            Q.values[np.divmod(visited, Q.n_actions)] += alpha * sums[visited] / counts[visited]
+            if timed:
+                profiler.record_step(t1 - t0, t2 - t1, t3 - t2, time.perf_counter() - t3)
+
+            if done[0]:
+                recorder.record_episodes(np.full(n, t), episode_rewards, w[:n], episode_inventory / t)
+                if profiler is not None:
+                    profiler.record_episode(t + 1, n)
+                break
+
+            state = next_state
+
+        progress(first_episode + n, num_episodes)
+
+    return Q, recorder.episode_stats()
+
+
+def random_actions(env, num_episodes, progress=None, profiler=None, recorder=None):
+    """
+    This agent takes random actions for each step of the way. No learning is present, so returning value function
+    results in None.
+    """
+    return None, _run_fixed_policy(env, num_episodes, "Random actions",
+                                   lambda: np.random.choice(np.arange(env.action_space_size)),
+                                   progress, profiler, recorder)
+
+
+def zero_tick(env, num_episodes, progress=None, profiler=None, recorder=None):
     """
     This agent will always pick action that is 0 ticks away from best id and best ask price.  No learning is present,
     so returning value function results in None.
     """
+    return None, _run_fixed_policy(env, num_episodes, "Zero-tick", lambda: 0, progress, profiler, recorder)
+
+
+def avellaneda_stoikov_table(env, gamma=0.1, sigma=None, kappa=None, max_inventory=20):
+    """
+    Precompute Avellaneda-Stoikov quotes for every inventory in [-max_inventory, max_inventory] and every number of
+    steps left. Reservation price is s - q * gamma * sigma^2 * (T - t) and total spread is
+    gamma * sigma^2 * (T - t) + 2 / gamma * ln(1 + gamma / kappa). Both quotes are rounded to the nearest tick distance
+    from mid price the action space offers (0, 1 or 2 ticks).
+    :param env: environment, used for tick size, time step and fill decay
+    :param gamma: risk aversion
+    :param sigma: price volatility, taken from env.process if None
+    :param kappa: decay of fill intensity per unit of price, taken from env fill decay per tick if None
+    :param max_inventory: inventories beyond this are quoted as if they were at it
+    :return: Integer array of actions, indexed by [inventory + max_inventory, steps left]
+    """
+    sigma = env.process.volatility if sigma is None else sigma
+    kappa = abs(env.fill_decay) / env.tick if kappa is None else kappa
+    n_steps = int(round(env.total_time / env.delta_t))
+
+    inventory = np.arange(-max_inventory, max_inventory + 1)[:, np.newaxis]
+    time_left = np.arange(n_steps + 1)[np.newaxis, :] * env.delta_t
+
+    reservation_offset = -inventory * gamma * sigma ** 2 * time_left
+    spread = gamma * sigma ** 2 * time_left + 2 / gamma * np.log(1 + gamma / kappa)
+
+    # Distance of bid and ask from mid price, in ticks
+    d_bid = np.clip(np.rint((spread / 2 - reservation_offset) / env.tick), 0, 2).astype(int)
+    d_ask = np.clip(np.rint((spread / 2 + reservation_offset) / env.tick), 0, 2).astype(int)
+
+    return d_bid * 3 + d_ask
+
+
+def avellaneda_stoikov(env, num_episodes, gamma=0.1, sigma=None, kappa=None, max_inventory=20, progress=None,
+                       profiler=None, recorder=None):
+    """
+    This agent quotes analytic Avellaneda-Stoikov bid and ask prices, looked up from a table computed once before
+    the first episode. No learning is present, so returning value function results in None.
+    """
+    table = avellaneda_stoikov_table(env, gamma, sigma, kappa, max_inventory)
+    n_steps = table.shape[1] - 1
+
+    def choose_action():
+        inventory = min(max(env.inventory, -max_inventory), max_inventory)
+        return table[inventory + max_inventory, min(max(int(env.time_left), 0), n_steps)]
+
+    return None, _run_fixed_policy(env, num_episodes, "Avellaneda-Stoikov", choose_action, progress, profiler,
+                                   recorder)
+
+
+def _run_fixed_policy(env, num_episodes, label, choose_action, progress=None, profiler=None, recorder=None):
+    """
+    Run episodes with actions chosen by a fixed policy, without any learning.
+    :param choose_action: function without arguments returning action for current environment state
+    :param progress: callback taking (episode, num_episodes), rate-limited ProgressPrinter if None
+    :param profiler: optional learning.instrumentation.Profiler
+    :param recorder: where statistics are recorded, learning.recorder.MemoryRecorder if None
+    :return: EpisodeStats
+    """
 
     # Keeps track of useful statistics
-    stats = EpisodeStats("Zero-tick",
-                         episode_lengths=np.zeros(num_episodes),
-                         episode_rewards=np.zeros(num_episodes),
-                         episode_profits=np.zeros(num_episodes),
-                         episode_inventory=np.zeros(num_episodes))
+    recorder = recorder or MemoryRecorder()
+    recorder.begin(label, num_episodes)
+
+    progress = progress or ProgressPrinter()
 
     for i_episode in range(num_episodes):
-        if (i_episode + 1) % 10 == 0:
-            print("\rEpisode {}/{}.".format(i_episode + 1, num_episodes), end="")
-            sys.stdout.flush()
+        progress(i_episode + 1, num_episodes)
+        timed = profiler is not None and profiler.sample(i_episode)
 
         # Reset the environment and pick the first action
         env.reset()
+        episode_reward = 0
+        episode_inventory = 0
 
         # Step through the environment until finished
         for t in itertools.count():
 
-            action = 0
+            if timed:
+                t0 = time.perf_counter()
+
+            action = choose_action()
+            if timed:
+                t1 = time.perf_counter()
             next_state, reward, done, w, i = env.step(action)
+            if timed:
+                t2 = time.perf_counter()
 
             # Update statistics
-            stats.episode_rewards[i_episode] += reward
-            stats.episode_lengths[i_episode] = t
-            stats.episode_profits[i_episode] = w
-            stats.episode_inventory[i_episode] += abs(i)
+            episode_reward += reward
+            episode_inventory += abs(i)
+            if recorder.record_steps:
+                recorder.record_step(i_episode, t, action, env.current_price, reward, w, i)
+            if timed:
+                profiler.record_step(t1 - t0, t2 - t1, time.perf_counter() - t2)
 
             if done:
-                stats.episode_inventory[i_episode] /= t
+                recorder.record_episode(t, episode_reward, w, episode_inventory / t)
+                if profiler is not None:
+                    profiler.record_episode(t + 1)
                 break
 
-    return None, stats
+    return recorder.episode_stats()
@@ -0,0 +1,206 @@
+import copy
+import math
+
+import numpy as np
+
+from learning.checkpoint import recorder_state, restore_recorder
+
+
+class RunningStats:
+    """
+    Mean and variance updated one value at a time, with Welford's algorithm. Variance is the population one, same as
+    numpy's default.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self._m2 = 0.
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def update_batch(self, values):
+        """
+        Add an array of values at once, merging their mean and variance with the running ones (Chan et al.).
+        """
+        n = len(values)
+        if n == 0:
+            return
+        mean = float(np.mean(values))
+        m2 = float(np.sum((values - mean) ** 2))
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    @property
+    def variance(self):
+        return self._m2 / self.count if self.count else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class RollingMean:
+    """
+    Mean of the last window values, kept in a ring buffer together with their running sum.
+    """
+
+    def __init__(self, window):
+        self.buffer = np.zeros(window)
+        self.count = 0
+        self.sum = 0.
+
+    def update(self, value):
+        i = self.count % len(self.buffer)
+        self.sum += value - self.buffer[i]
+        self.buffer[i] = value
+        self.count += 1
+
+    @property
+    def value(self):
+        """Current mean, NaN until window fills up."""
+        return self.sum / len(self.buffer) if self.count >= len(self.buffer) else math.nan
+
+
+class DecimatedSeries:
+    """
+    History of a series in bounded memory. Every stride-th value is kept. Once max_points values are kept, every
+    other one is dropped and stride doubles, so a series of any length ends up with between max_points / 2 and
+    max_points evenly spaced points.
+    """
+
+    def __init__(self, max_points=10000):
+        self.values = np.empty(max_points + max_points % 2)
+        self.n = 0
+        self.stride = 1
+        self.count = 0
+
+    def append(self, value):
+        if self.count % self.stride == 0:
+            if self.n == len(self.values):
+                kept = self.values[:self.n:2].copy()
+                self.n = len(kept)
+                self.values[:self.n] = kept
+                self.stride *= 2
+            if self.count % self.stride == 0:
+                self.values[self.n] = value
+                self.n += 1
+        self.count += 1
+
+    @property
+    def x(self):
+        """Indices of kept values in the full series."""
+        return np.arange(self.n) * self.stride
+
+    @property
+    def y(self):
+        """Kept values."""
+        return self.values[:self.n]
+
+
+class OnlineAggregate:
+    """
+    Aggregates of one agent's episodes, updated in O(1) as every episode finishes: Welford mean and variance of
+    profit and inventory, rolling mean of reward, and decimated histories of these for plotting. Pass it to an agent
+    as recorder. Episodes are forwarded to an inner recorder if one is given, agent then returns its statistics,
+    otherwise the aggregate itself is returned in their place. Plot functions of plotting.plot_utils accept both.
+    """
+
+    def __init__(self, recorder=None, smoothing_window=10, max_points=10000, initial_wealth=1000):
+        self.recorder = recorder
+        self.smoothing_window = smoothing_window
+        self.max_points = max_points
+        self.initial_wealth = initial_wealth
+        self.begin(None)
+
+    @property
+    def record_steps(self):
+        return self.recorder is not None and self.recorder.record_steps
+
+    def begin(self, label, num_episodes=None):
+        """
+        Reset aggregates for an agent with given label.
+        """
+        self.label = label
+        self.profit = RunningStats()
+        self.inventory = RunningStats()
+        self.reward = RollingMean(self.smoothing_window)
+
+        self.total_profit = 0.
+        self.total_inventory = 0.
+        self.profits = DecimatedSeries(self.max_points)
+        self.inventories = DecimatedSeries(self.max_points)
+        self.rolling_rewards = DecimatedSeries(self.max_points)
+        self.cumulative_profit = DecimatedSeries(self.max_points)
+        self.cumulative_inventory = DecimatedSeries(self.max_points)
+
+        if self.recorder is not None and label is not None:
+            self.recorder.begin(label, num_episodes)
+
+    def record_episode(self, length, reward, profit, inventory):
+        """
+        Update aggregates with statistics of one finished episode.
+        """
+        self._update(reward, profit, inventory)
+        if self.recorder is not None:
+            self.recorder.record_episode(length, reward, profit, inventory)
+
+    def record_episodes(self, lengths, rewards, profits, inventory):
+        """
+        Update aggregates with statistics of several finished episodes, given as arrays.
+        """
+        for episode in zip(rewards, profits, inventory):
+            self._update(*episode)
+        if self.recorder is not None:
+            self.recorder.record_episodes(lengths, rewards, profits, inventory)
+
+    def _update(self, reward, profit, inventory):
+        self.profit.update(profit)
+        self.inventory.update(inventory)
+        self.reward.update(reward)
+
+        self.total_profit += profit - self.initial_wealth
+        self.total_inventory += inventory
+        self.profits.append(profit)
+        self.inventories.append(inventory)
+        self.rolling_rewards.append(self.reward.value)
+        self.cumulative_profit.append(self.total_profit)
+        self.cumulative_inventory.append(self.total_inventory)
+
+    def record_step(self, *trace):
+        self.recorder.record_step(*trace)
+
+    def record_steps_batch(self, *traces):
+        self.recorder.record_steps_batch(*traces)
+
+    def episode_stats(self):
+        """
+        :return: Statistics of inner recorder, or this aggregate if there is none
+        """
+        return self.recorder.episode_stats() if self.recorder is not None else self
+
+    def checkpoint_state(self):
+        """
+        :return: Picklable state to continue from, copies of the aggregates, which are bounded in size, and state of
+        inner recorder
+        """
+        aggregates = {name: value for name, value in vars(self).items() if name != "recorder"}
+        return copy.deepcopy(aggregates), recorder_state(self.recorder) if self.recorder is not None else None
+
+    def restore_state(self, label, num_episodes, state):
+        """
+        Begin again with aggregates of a checkpoint_state(), in place of begin().
+        """
+        aggregates, inner_state = state
+        vars(self).update(copy.deepcopy(aggregates))
+        self.label = label
+        if self.recorder is not None:
+            restore_recorder(self.recorder, label, num_episodes, inner_state)
+
@@ -0,0 +1,228 @@
+import copy
+import itertools
+import time
+
+import numpy as np
+
+from learning.instrumentation import ProgressPrinter
+from learning.recorder import MemoryRecorder
+
+# Raw state features, see features()
+FEATURES = ("inventory", "time_left", "price_change")
+
+
+def features(env, start_price, inventory_scale=10, price_scale=1):
+    """
+    Continuous state of an environment, instead of its binned state number: inventory, fraction of the episode left
+    and price change since the start of the episode, each divided by a scale of its typical size.
+    :return: Array of len(FEATURES) values
+    """
+    return np.array([env.inventory / inventory_scale,
+                     env.time_left * env.delta_t / env.total_time,
+                     (env.current_price - start_price) / price_scale])
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of transitions in preallocated arrays. Once capacity is reached the oldest transitions are
+    overwritten, so memory never grows. Minibatches are drawn uniformly with one fancy-indexing call per array.
+    """
+
+    def __init__(self, capacity, n_features, rng=None):
+        self.states = np.zeros((capacity, n_features))
+        self.actions = np.zeros(capacity, dtype=int)
+        self.rewards = np.zeros(capacity)
+        self.next_states = np.zeros((capacity, n_features))
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.capacity = capacity
+        self.n = 0
+        self.position = 0
+
+        # Source of sampled indices, global numpy state unless a generator (or a seed for one) is given
+        if rng is None:
+            self.rng = np.random
+        elif isinstance(rng, np.random.Generator):
+            self.rng = rng
+        else:
+            self.rng = np.random.default_rng(rng)
+
+    def __len__(self):
+        return self.n
+
+    def add(self, state, action, reward, next_state, done):
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.n = min(self.n + 1, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        :return: Tuple of arrays (states, actions, rewards, next_states, dones), each with batch_size rows
+        """
+        indices = (self.rng.random(batch_size) * self.n).astype(int)
+        return (self.states[indices], self.actions[indices], self.rewards[indices], self.next_states[indices],
+                self.dones[indices])
+
+
+class LinearModel:
+    """
+    Action values linear in state features, one weight vector and bias per action.
+    """
+
+    def __init__(self, n_features, n_actions):
+        self.weights = np.zeros((n_features, n_actions))
+        self.bias = np.zeros(n_actions)
+
+    def predict(self, states):
+        """
+        :param states: array of shape (batch, n_features)
+        :return: Action values, array of shape (batch, n_actions)
+        """
+        return states @ self.weights + self.bias
+
+    def update(self, states, actions, targets, learning_rate):
+        """
+        One gradient descent step on mean squared error between values of taken actions and targets.
+        """
+        rows = np.arange(len(actions))
+        grad = np.zeros((len(actions), self.bias.shape[0]))
+        grad[rows, actions] = (self.predict(states)[rows, actions] - targets) / len(actions)
+        self.weights -= learning_rate * states.T @ grad
+        self.bias -= learning_rate * grad.sum(axis=0)
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+
+class MLP:
+    """
+    Action values from a small multilayer perceptron with ReLU hidden layers, in plain NumPy.
+    """
+
+    def __init__(self, n_features, n_actions, hidden=(32,), rng=None):
+        rng = np.random if rng is None else rng
+        sizes = (n_features,) + tuple(hidden) + (n_actions,)
+        # He initialization of weights, zero biases
+        self.weights = [rng.standard_normal((n_in, n_out)) * np.sqrt(2 / n_in) for n_in, n_out in zip(sizes, sizes[1:])]
+        self.biases = [np.zeros(n_out) for n_out in sizes[1:]]
+
+    def _forward(self, states):
+        activations = [states]
+        for W, b in zip(self.weights[:-1], self.biases[:-1]):
+            activations.append(np.maximum(activations[-1] @ W + b, 0))
+        return activations, activations[-1] @ self.weights[-1] + self.biases[-1]
+
+    def predict(self, states):
+        """
+        :param states: array of shape (batch, n_features)
+        :return: Action values, array of shape (batch, n_actions)
+        """
+        return self._forward(states)[1]
+
+    def update(self, states, actions, targets, learning_rate):
+        """
+        One backpropagation step on mean squared error between values of taken actions and targets.
+        """
+        activations, values = self._forward(states)
+        rows = np.arange(len(actions))
+        grad = np.zeros_like(values)
+        grad[rows, actions] = (values[rows, actions] - targets) / len(actions)
+
+        for layer in reversed(range(len(self.weights))):
+            grad_weights = activations[layer].T @ grad
+            grad_biases = grad.sum(axis=0)
+            if layer > 0:
+                grad = (grad @ self.weights[layer].T) * (activations[layer] > 0)
+            self.weights[layer] -= learning_rate * grad_weights
+            self.biases[layer] -= learning_rate * grad_biases
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+
+def approximate_q_learning(env, num_episodes, model=None, discount_factor=0.9, learning_rate=0.01, epsilon=0.1,
+                           buffer_size=100000, batch_size=64, train_every=1, target_update=1000, progress=None,
+                           profiler=None, recorder=None):
+    """
+    Q-learning with a function approximator over raw state features (see features()) instead of a table. Transitions
+    go to a replay buffer, and every train_every steps the model is fitted on a minibatch sampled from it, with
+    targets from a copy of the model refreshed every target_update steps.
+    :param model: LinearModel or MLP, MLP with one hidden layer of 32 units if None
+    :param progress: callback taking (episode, num_episodes), rate-limited ProgressPrinter if None
+    :param profiler: optional learning.instrumentation.Profiler
+    :param recorder: where statistics are recorded, learning.recorder.MemoryRecorder if None
+    :return: Trained model and episode statistics
+    """
+    model = model or MLP(len(FEATURES), env.action_space_size)
+    target_model = model.copy()
+    buffer = ReplayBuffer(buffer_size, len(FEATURES))
+
+    # Keeps track of useful statistics
+    recorder = recorder or MemoryRecorder()
+    recorder.begin("Approximate Q-learning", num_episodes)
+
+    progress = progress or ProgressPrinter()
+    total_steps = 0
+
+    for i_episode in range(num_episodes):
+        progress(i_episode + 1, num_episodes)
+        timed = profiler is not None and profiler.sample(i_episode)
+
+        # Reset the environment and pick the first action
+        env.reset()
+        start_price = env.current_price
+        state = features(env, start_price)
+        episode_reward = 0
+        episode_inventory = 0
+
+        # Step through the environment until finished
+        for t in itertools.count():
+
+            if timed:
+                t0 = time.perf_counter()
+
+            # Take a step, following epsilon-greedy policy
+            if np.random.random() < epsilon:
+                action = np.random.randint(env.action_space_size)
+            else:
+                action = int(model.predict(state[np.newaxis])[0].argmax())
+            if timed:
+                t1 = time.perf_counter()
+            _, reward, done, w, i = env.step(action)
+            next_state = features(env, start_price)
+            if timed:
+                t2 = time.perf_counter()
+
+            # Update statistics
+            episode_reward += reward
+            episode_inventory += abs(i)
+            if recorder.record_steps:
+                recorder.record_step(i_episode, t, action, env.current_price, reward, w, i)
+            if timed:
+                t3 = time.perf_counter()
+
+            # Minibatch update from replay buffer
+            buffer.add(state, action, reward, next_state, done)
+            total_steps += 1
+            if len(buffer) >= batch_size and total_steps % train_every == 0:
+                states, actions, rewards, next_states, dones = buffer.sample(batch_size)
+                targets = rewards + discount_factor * ~dones * target_model.predict(next_states).max(axis=1)
+                model.update(states, actions, targets, learning_rate)
+            if total_steps % target_update == 0:
+                target_model = model.copy()
+            if timed:
+                profiler.record_step(t1 - t0, t2 - t1, t3 - t2, time.perf_counter() - t3)
+
+            if done:
+                recorder.record_episode(t, episode_reward, w, episode_inventory / t)
+                if profiler is not None:
+                    profiler.record_episode(t + 1)
+                break
+
+            state = next_state
+
+    return model, recorder.episode_stats()
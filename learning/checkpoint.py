@@ -0,0 +1,159 @@
+import os
+import pickle
+import random
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+# Everything needed to continue training exactly where it stopped. Recorder state is the one of the recorder's own
+# checkpoint_state(). Random states are those of the python and numpy global generators, and of the environment's and
+# its process's own generators (None where they use global ones).
+Checkpoint = namedtuple("Checkpoint", ["episode", "q_values", "recorder_state", "random_state", "numpy_state",
+                                       "env_rng_state", "process_state"])
+
+
+def _generator_state(obj):
+    rng = getattr(obj, "rng", None)
+    return rng.bit_generator.state if isinstance(rng, np.random.Generator) else None
+
+
+def recorder_state(recorder):
+    """
+    :return: Checkpoint state of a recorder
+    :raises ValueError: if the recorder cannot be checkpointed
+    """
+    if not hasattr(recorder, "checkpoint_state") or not hasattr(recorder, "restore_state"):
+        raise ValueError("Recorder {} cannot be checkpointed".format(type(recorder).__name__))
+    return recorder.checkpoint_state()
+
+
+def restore_recorder(recorder, label, num_episodes, state):
+    """
+    Begin recording again from a state of recorder_state(), in place of recorder.begin().
+    :raises ValueError: if the recorder cannot be restored, or the state is not one of such a recorder
+    """
+    if not hasattr(recorder, "restore_state"):
+        raise ValueError("Recorder {} cannot be restored".format(type(recorder).__name__))
+    if state is None:
+        raise ValueError("Checkpoint has no statistics for recorder {}".format(type(recorder).__name__))
+    recorder.restore_state(label, num_episodes, state)
+
+
+def capture(episode, Q, recorder, env):
+    """
+    Snapshot of training after given number of finished episodes. Q-table is copied, recorder only gives its own
+    position and state, so nothing it already wrote out is read or copied.
+    :param recorder: recorder of the agent, one with checkpoint_state() and restore_state()
+    :return: Checkpoint
+    """
+    process = env.process if hasattr(env, "process") else None
+    return Checkpoint(
+        episode=episode,
+        q_values=Q.values.copy(),
+        recorder_state=recorder_state(recorder),
+        random_state=random.getstate(),
+        numpy_state=np.random.get_state(),
+        env_rng_state=_generator_state(env),
+        process_state={"rng": _generator_state(process), "index": getattr(process, "index", None)},
+    )
+
+
+def restore(checkpoint, env):
+    """
+    Set random states of global generators, environment and its process to the ones of a checkpoint.
+    """
+    random.setstate(checkpoint.random_state)
+    np.random.set_state(checkpoint.numpy_state)
+    if checkpoint.env_rng_state is not None:
+        env.rng.bit_generator.state = checkpoint.env_rng_state
+    process = env.process if hasattr(env, "process") else None
+    if checkpoint.process_state["rng"] is not None:
+        process.rng.bit_generator.state = checkpoint.process_state["rng"]
+    if checkpoint.process_state["index"] is not None:
+        process.index = checkpoint.process_state["index"]
+
+
+def save_checkpoint(checkpoint, filename):
+    """
+    Write a checkpoint. File is written under a temporary name first, so a killed process never leaves a truncated
+    file behind.
+    """
+    fields = checkpoint._asdict()
+    with open(filename + ".tmp", "wb") as f:
+        pickle.dump(fields, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(filename + ".tmp", filename)
+
+
+def load_checkpoint(filename):
+    """
+    Load a checkpoint written by save_checkpoint() or Checkpointer.
+    """
+    with open(filename, "rb") as f:
+        return Checkpoint(**pickle.load(f))
+
+
+class Checkpointer:
+    """
+    Writes checkpoints every given number of episodes in a background thread, so training only pauses to copy the
+    Q-table. If a checkpoint is submitted while the previous one is still being written, only the newest one waiting
+    is kept. Pass it to q_learning as checkpoint argument, and close it (or use it as a context manager) when done.
+    """
+
+    def __init__(self, filename, every=1000):
+        self.filename = filename
+        self.every = every
+        self.error = None
+
+        self._pending = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def due(self, episode):
+        """
+        :return: True if a checkpoint should be taken after given number of finished episodes
+        """
+        return episode % self.every == 0
+
+    def submit(self, checkpoint):
+        """
+        Queue a checkpoint for writing and return immediately.
+        """
+        with self._lock:
+            self._pending = checkpoint
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                checkpoint, self._pending = self._pending, None
+                closed = self._closed
+                self._wake.clear()
+            if checkpoint is not None:
+                try:
+                    save_checkpoint(checkpoint, self.filename)
+                except Exception as e:
+                    self.error = e
+            if closed:
+                return
+
+    def close(self):
+        """
+        Wait for the last submitted checkpoint to be written.
+        """
+        with self._lock:
+            self._closed = True
+            self._wake.set()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,157 @@
+import math
+from collections import namedtuple
+from itertools import combinations
+from statistics import NormalDist
+
+import numpy as np
+
+from learning.aggregates import RunningStats
+from learning.evaluation import compile_policy, evaluate_batch
+from models.path_bank import PathBank
+
+# Compared metrics, with +1 where higher is better and -1 where lower is better. Inventory is mean absolute inventory.
+METRICS = {"profit": 1, "inventory": -1}
+
+# Result of compare(). Means are arrays with one value per policy, intervals map pairs (i, j) of policy indices to
+# the confidence interval of mean difference of policy i and policy j. Ranking lists labels best first, decided is
+# True if every pair of the ranking is significantly different. All but labels and n_episodes are keyed by metric.
+Comparison = namedtuple("Comparison", ["labels", "n_episodes", "means", "intervals", "ranking", "decided"])
+
+
+def compare(policies, env, labels=None, metrics=("profit", "inventory"), confidence=0.95, budget=100000,
+            min_episodes=None):
+    """
+    Sequential paired comparison of fixed policies. Policies are run in batches of env.n_envs episodes, all of them on
+    the same price paths and fill random numbers, so differences between them are measured episode by episode. Mean
+    and variance of every paired difference are updated after every batch, and comparison stops as soon as the
+    ranking of every metric is decided, or the budget of episodes per policy is spent.
+
+    Pairs whose differences are all exactly zero, as those of identical policies, are ties and do not keep a ranking
+    undecided. Intervals use a normal approximation. Every batch is a look at the data, so the confidence level is split
+    (Bonferroni) over all pairs and all looks the budget allows: intervals are conservative, but stopping early does
+    not overstate confidence.
+    :param policies: list of policies accepted by learning.evaluation.evaluate
+    :param env: BatchBrownInventoryTimeStateEnv, its process and rng are restored after the comparison
+    :param labels: label of every policy, their indices if None
+    :param metrics: names of METRICS the ranking must be decided on
+    :param confidence: confidence level of the ranking of every metric
+    :param budget: maximum number of episodes per policy
+    :param min_episodes: episodes per policy before the first look, one batch if None
+    :return: Comparison
+    """
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError("Unknown metric: {}".format(metric))
+    if len(policies) < 2:
+        raise ValueError("At least two policies are needed")
+
+    policies = [policy if isinstance(policy, str) else _compile(policy) for policy in policies]
+    labels = list(labels) if labels is not None else [str(i) for i in range(len(policies))]
+    pairs = list(combinations(range(len(policies)), 2))
+
+    # Critical value, split over pairs and looks
+    n_looks = max(int(math.ceil(budget / env.n_envs)), 1)
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / (2 * len(pairs) * n_looks))
+
+    totals = {metric: np.zeros(len(policies)) for metric in metrics}
+    differences = {metric: {pair: RunningStats() for pair in pairs} for metric in metrics}
+    min_episodes = min_episodes or env.n_envs
+
+    process, rng = env.process, env.rng
+    n_episodes = 0
+    try:
+        while n_episodes < budget:
+            n = min(env.n_envs, budget - n_episodes)
+            results = _run_paired(policies, env, process, rng, n)
+            for metric in metrics:
+                totals[metric] += [values.sum() for values in results[metric]]
+                for i, j in pairs:
+                    differences[metric][i, j].update_batch(results[metric][i] - results[metric][j])
+            n_episodes += n
+
+            if n_episodes >= min_episodes and \
+                    all(_decided(differences[metric], z) for metric in metrics):
+                break
+    finally:
+        env.process, env.rng = process, rng
+
+    means = {metric: totals[metric] / n_episodes for metric in metrics}
+    intervals = {metric: {pair: _interval(stats, z) for pair, stats in differences[metric].items()}
+                 for metric in metrics}
+    ranking = {metric: [labels[i] for i in np.argsort(-METRICS[metric] * means[metric], kind="stable")]
+               for metric in metrics}
+    decided = {metric: _decided(differences[metric], z) for metric in metrics}
+    return Comparison(labels, n_episodes, means, intervals, ranking, decided)
+
+
+def _compile(policy):
+    policy = np.asarray(policy)
+    return compile_policy(policy) if policy.ndim == 2 else policy
+
+
+def _run_paired(policies, env, process, rng, n):
+    """
+    Run one batch of every policy on the same price paths and fill random numbers. Random actions are drawn from a
+    generator of their own, so they do not shift the fill random numbers of the policies run with them.
+    :param process: original process of env, generating fresh paths for every batch
+    :param rng: original random generator of env, seeding fills and random actions of every batch
+    :return: Dictionary mapping metric -> list of arrays of n episode values, one per policy
+    """
+    paths = PathBank(process.generate_batch(env.n_envs))
+    fill_seed, action_seed = rng.integers(2 ** 63 - 1, size=2)
+
+    results = {metric: [] for metric in METRICS}
+    for policy in policies:
+        env.process = paths.replay()
+        env.rng = np.random.default_rng(fill_seed)
+        _, _, profits, inventory, _ = evaluate_batch(policy, env, np.random.default_rng(action_seed))
+        results["profit"].append(profits[:n])
+        results["inventory"].append(inventory[:n])
+    return results
+
+
+def _interval(stats, z):
+    """
+    Confidence interval of a mean difference, from its running statistics.
+    """
+    if stats.count < 2:
+        return -math.inf, math.inf
+    half_width = z * math.sqrt(stats.variance / (stats.count - 1))
+    return stats.mean - half_width, stats.mean + half_width
+
+
+def _tied(stats):
+    """
+    Whether every difference of a pair so far was exactly zero.
+    """
+    return stats.count > 0 and stats.mean == 0 and stats.variance == 0
+
+
+def _decided(differences, z):
+    """
+    Whether intervals of all pairs but ties exclude zero.
+    """
+    for stats in differences.values():
+        if _tied(stats):
+            continue
+        low, high = _interval(stats, z)
+        if low <= 0 <= high:
+            return False
+    return True
+
+
+def report(comparison):
+    """
+    Describe a comparison, one line per metric ranking and per pair.
+    :return: List of lines
+    """
+    lines = ["{} episodes per policy".format(comparison.n_episodes)]
+    for metric, ranking in comparison.ranking.items():
+        lines.append("{} ranking{}: {}".format(metric, "" if comparison.decided[metric] else " (undecided)",
+                                               " > ".join(ranking)))
+        for (i, j), (low, high) in comparison.intervals[metric].items():
+            lines.append("  {} - {}: {:.4f} [{:.4f}, {:.4f}]{}".format(
+                comparison.labels[i], comparison.labels[j],
+                comparison.means[metric][i] - comparison.means[metric][j], low, high,
+                " tie" if low == high == 0 else ""))
+    return lines
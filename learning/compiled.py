@@ -0,0 +1,148 @@
+import math
+
+import numpy as np
+
+from envs.jit import njit
+from envs.utility import MAX_EXPONENT
+from learning.instrumentation import ProgressPrinter
+from learning.q_table import QTable
+from learning.recorder import MemoryRecorder
+
+
+@njit(cache=True)
+def _q_learning_episodes(Q, prices, seed, total_time, delta_t, a, time_decay, tick, fill_table, inventory_bins,
+                         time_components, terminal_penalty, risk_aversion, discount_factor, alpha, epsilon,
+                         episode_lengths, episode_rewards, episode_profits, episode_inventory):
+    """
+    Run one Q-learning episode on every row of prices, following BrownInventoryTimeStateEnv step by step. Fill
+    probabilities and states are looked up from the env's fill table and state encoder arrays.
+    Q and statistics arrays are updated in place. Risk aversion of NaN stands for the env's None.
+    """
+    np.random.seed(seed)
+    n_actions = Q.shape[1]
+    max_inventory = len(inventory_bins) // 2
+
+    for e in range(prices.shape[0]):
+
+        # Reset the environment
+        value = 1000.
+        inventory = 0
+        current_time = 0.
+        iteration = 0
+        price = prices[e, 0]
+        state = time_components[0] + inventory_bins[max_inventory]
+        reward_sum = 0.
+        inventory_sum = 0.
+
+        t = 0
+        while True:
+
+            # Take a step, following epsilon-greedy policy
+            if np.random.random() < epsilon:
+                action = np.random.randint(0, n_actions)
+            else:
+                action = np.argmax(Q[state])
+
+            prev_inventory = inventory
+            prev_wealth = value + inventory * price
+
+            d_bid = action // 3
+            d_ask = action % 3
+            if np.random.random() < fill_table[action, 0]:
+                value -= price - d_bid * tick
+                inventory += 1
+            if np.random.random() < fill_table[action, 1]:
+                value += price + d_ask * tick
+                inventory -= 1
+
+            next_state = time_components[iteration] + \
+                inventory_bins[min(max(inventory, -max_inventory), max_inventory) + max_inventory]
+            decay = time_decay[iteration]
+            if abs(inventory) < abs(prev_inventory):
+                decay = -decay
+            reward = a * (value + inventory * price - prev_wealth) + decay
+            done = total_time - delta_t <= current_time
+
+            current_time += delta_t
+            iteration += 1
+            if not done:
+                price = prices[e, iteration]
+            elif math.isnan(risk_aversion):
+                reward *= math.exp(-terminal_penalty * abs(inventory))
+            elif risk_aversion > 0:
+                # Risk aversion of 0 is the risk neutral limit, where CARA utility adds nothing to the reward
+                wealth = value + inventory * price
+                exponent = min(-risk_aversion * (wealth - 1000), MAX_EXPONENT)
+                reward += a * (-math.expm1(exponent) / risk_aversion - (wealth - 1000))
+
+            # Update statistics
+            reward_sum += reward
+            inventory_sum += abs(inventory)
+
+            # TD Update
+            td_target = reward + discount_factor * np.max(Q[next_state])
+            Q[state, action] += alpha * (td_target - Q[state, action])
+
+            if done:
+                episode_lengths[e] = t
+                episode_rewards[e] = reward_sum
+                episode_profits[e] = value + inventory * price
+                episode_inventory[e] = inventory_sum / t
+                break
+
+            state = next_state
+            t += 1
+
+
+def _risk_aversion(env):
+    """
+    :return: Risk aversion of env as the compiled episodes take it, NaN for None
+    """
+    if env.risk_aversion is None:
+        return math.nan
+    if env.risk_aversion < 0:
+        raise ValueError("Risk aversion must not be negative: {}".format(env.risk_aversion))
+    return float(env.risk_aversion)
+
+
+def q_learning(env, num_episodes, discount_factor=0.9, alpha=0.5, epsilon=0.1, chunk_size=1000, progress=None,
+               profiler=None, recorder=None, initial_q=None):
+    """
+    Q-Learning on a BrownInventoryTimeStateEnv, with whole episodes run inside one compiled function. Prices are
+    generated by env.process in chunks of episodes, random numbers of the compiled loop are seeded from the global
+    numpy state. Without numba the same code runs as plain Python.
+    :param progress: callback taking (episode, num_episodes), called once per chunk
+    :param profiler: optional learning.instrumentation.Profiler, only steps and episodes are counted
+    :param recorder: where statistics are recorded, learning.recorder.MemoryRecorder if None. Per-step traces are
+    not recorded by this engine.
+    :param initial_q: QTable or array to start from instead of zeros
+    :return: QTable and EpisodeStats, same as learning.agents.q_learning
+    """
+    Q = QTable.for_env(env)
+    if initial_q is not None:
+        Q.values[:] = np.asarray(initial_q)
+    recorder = recorder or MemoryRecorder()
+    recorder.begin("Q-learning", num_episodes)
+
+    progress = progress or ProgressPrinter()
+
+    # Lookup tables of the environment's components
+    fill_table = np.asarray(env.fill_table, dtype=np.float64)
+    inventory_bins = np.asarray(env.state_encoder.inventory_encoder.bins, dtype=np.int64)
+    time_components = np.asarray(env.state_encoder.time_components, dtype=np.int64)
+
+    for first in range(0, num_episodes, chunk_size):
+        n = min(chunk_size, num_episodes - first)
+        prices = env.process.generate_batch(n)
+        lengths, rewards, profits, inventory = np.zeros((4, n))
+        _q_learning_episodes(Q.values, prices, np.random.randint(2 ** 31 - 1), env.total_time, env.delta_t,
+                             env.a, np.asarray(env.time_decay), env.tick, fill_table, inventory_bins,
+                             time_components, env.terminal_penalty, _risk_aversion(env), discount_factor, alpha,
+                             epsilon, lengths, rewards, profits, inventory)
+        recorder.record_episodes(lengths, rewards, profits, inventory)
+        if profiler is not None:
+            for steps in lengths:
+                profiler.record_episode(int(steps) + 1)
+        progress(first + n, num_episodes)
+
+    return Q, recorder.episode_stats()
@@ -0,0 +1,78 @@
+import hashlib
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from envs.brown_inventory_time_env import BrownInventoryTimeStateEnv
+from models.brownian_model import StochasticProcess
+
+# Parameters of the price process and the environment, defaults are the ones main.py uses. Environment classes that
+# do not simulate prices with a process, or fills with fill_intensity and fill_decay, ignore those parameters.
+EnvConfig = namedtuple("EnvConfig",
+                       ["total_time", "delta_t", "volatility", "initial_asset_price", "a", "b", "tick", "bin_size",
+                        "fill_intensity", "fill_decay", "terminal_penalty", "risk_aversion", "env_class"],
+                       defaults=[1, 0.005, 2, 100, 4, 1, 0.1, 20, 140, -1.5, 0.1, None, "BrownInventoryTimeStateEnv"])
+
+# Parameters of q_learning
+LearnerConfig = namedtuple("LearnerConfig", ["discount_factor", "alpha", "epsilon"], defaults=[0.9, 0.5, 0.1])
+
+
+def _brown_inventory_time_env(config, rng):
+    process = StochasticProcess(config.total_time, config.delta_t, config.volatility, config.initial_asset_price,
+                                rng=rng)
+    return BrownInventoryTimeStateEnv(config.total_time, config.delta_t, process, config.a, config.b,
+                                      tick=config.tick, bin_size=config.bin_size,
+                                      fill_intensity=config.fill_intensity, fill_decay=config.fill_decay,
+                                      terminal_penalty=config.terminal_penalty, risk_aversion=config.risk_aversion)
+
+
+def _order_book_env(config, rng):
+    # Imported here, as it loads numba, which workers running other environments should not pay for
+    from envs.order_book_env import OrderBookEnv
+
+    if rng is not None and not isinstance(rng, np.random.Generator):
+        rng = np.random.default_rng(rng)
+    return OrderBookEnv(config.total_time, config.delta_t, config.a, config.b, tick=config.tick,
+                        initial_price=config.initial_asset_price, bin_size=config.bin_size,
+                        terminal_penalty=config.terminal_penalty, risk_aversion=config.risk_aversion, rng=rng)
+
+
+# Environment classes that can be built from an EnvConfig, by name
+ENV_CLASSES = {
+    "BrownInventoryTimeStateEnv": _brown_inventory_time_env,
+    "OrderBookEnv": _order_book_env,
+}
+
+
+def make_env(config, rng=None):
+    """
+    Build an environment of class config.env_class, with its own source of randomness, from an EnvConfig.
+    :param config: EnvConfig
+    :param rng: random generator (or seed) of price process (order flow of OrderBookEnv), global numpy state if None
+    :return: environment
+    """
+    if config.env_class not in ENV_CLASSES:
+        raise ValueError("Unknown environment class: {}".format(config.env_class))
+    return ENV_CLASSES[config.env_class](config, rng)
+
+
+def split_params(params):
+    """
+    Split a flat dictionary of parameters into an EnvConfig and a LearnerConfig, unknown names raise ValueError.
+    """
+    unknown = set(params) - set(EnvConfig._fields) - set(LearnerConfig._fields)
+    if unknown:
+        raise ValueError("Unknown parameters: {}".format(", ".join(sorted(unknown))))
+
+    env_config = EnvConfig(**{name: value for name, value in params.items() if name in EnvConfig._fields})
+    learner_config = LearnerConfig(**{name: value for name, value in params.items() if name in LearnerConfig._fields})
+    return env_config, learner_config
+
+
+def config_hash(*parts):
+    """
+    Stable hash of configs and other JSON-serializable values, used as key of cached results.
+    """
+    serializable = [part._asdict() if hasattr(part, "_asdict") else part for part in parts]
+    return hashlib.sha1(json.dumps(serializable, sort_keys=True, default=lambda o: o.item()).encode()).hexdigest()[:16]
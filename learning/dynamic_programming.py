@@ -0,0 +1,160 @@
+from collections import namedtuple
+
+import numpy as np
+
+from learning.q_table import QTable
+
+# Optimal action values of the MDP over (step, inventory), inventories being -max_inventory to max_inventory
+Solution = namedtuple("Solution", ["q_values", "policy", "occupancy", "inventories", "discount_factor"])
+
+
+def episode_length(env):
+    """
+    Number of steps of an episode, found the same way as the environment finds its last step.
+    """
+    current_time = 0
+    for n_steps in range(1, int(env.total_time / env.delta_t) + 2):
+        if env.total_time - env.delta_t <= current_time:
+            return n_steps
+        current_time += env.delta_t
+    return n_steps
+
+
+def _fill_outcomes(env):
+    """
+    Probability, inventory change and spread gain of every combination of bid and ask fills, for every action.
+    :return: list of (probability, inventory change, spread gain), arrays of shape (n_actions, 1) where needed
+    """
+    actions = np.arange(env.action_space_size)[:, np.newaxis]
+    d_bid = actions // 3
+    d_ask = actions % 3
+    p_bid = np.minimum(env.fill_table[:, :1], 1)
+    p_ask = np.minimum(env.fill_table[:, 1:], 1)
+
+    outcomes = []
+    for bid_filled in (0, 1):
+        for ask_filled in (0, 1):
+            probability = (p_bid if bid_filled else 1 - p_bid) * (p_ask if ask_filled else 1 - p_ask)
+            # Fills happen at the current price, so wealth only changes by the distance of filled quotes from it
+            gain = env.tick * (bid_filled * d_bid + ask_filled * d_ask)
+            outcomes.append((probability, bid_filled - ask_filled, gain))
+    return outcomes
+
+
+def _backup(env, outcomes, inventories, step, n_steps, next_values, discount_factor):
+    """
+    Expected reward plus discounted value of the next step, for every action and inventory at given step.
+    :return: Array of shape (n_actions, n_inventories)
+    """
+    values = np.zeros((env.action_space_size, len(inventories)))
+    for probability, change, gain in outcomes:
+        next_inventory = inventories + change
+        reward = env.a * gain + np.copysign(env.time_decay[step], np.abs(next_inventory) - np.abs(inventories))
+        if step == n_steps - 1:
+            reward = reward * np.exp(-env.terminal_penalty * np.abs(next_inventory))
+            values += probability * reward
+        else:
+            # Inventories beyond the modelled range are kept at its boundary
+            next_index = np.clip(next_inventory - inventories[0], 0, len(inventories) - 1)
+            values += probability * (reward + discount_factor * next_values[next_index])
+    return values
+
+
+def solve(env, discount_factor=0.9, max_inventory=50):
+    """
+    Backward induction over the exact MDP of a BrownInventoryTimeStateEnv, with states (step, inventory). Fill
+    probabilities and rewards are known, and the reward does not depend on price, so expected rewards and transitions
+    follow from the four fill outcomes of every action.
+    :param env: BrownInventoryTimeStateEnv (or batch version) without risk_aversion, CARA rewards depend on price
+    :param discount_factor: discount of later rewards, same meaning as in q_learning
+    :param max_inventory: modelled inventories are -max_inventory to max_inventory
+    :return: Solution
+    """
+    if getattr(env, "risk_aversion", None) is not None:
+        raise ValueError("CARA rewards depend on price and cannot be solved over (step, inventory)")
+
+    n_steps = episode_length(env)
+    inventories = np.arange(-max_inventory, max_inventory + 1)
+    outcomes = _fill_outcomes(env)
+
+    q_values = np.zeros((n_steps, len(inventories), env.action_space_size))
+    values = np.zeros(len(inventories))
+    for step in reversed(range(n_steps)):
+        q_values[step] = _backup(env, outcomes, inventories, step, n_steps, values, discount_factor).T
+        values = q_values[step].max(axis=1)
+    policy = q_values.argmax(axis=2)
+
+    return Solution(q_values, policy, _occupancy(outcomes, inventories, policy), inventories, discount_factor)
+
+
+def _occupancy(outcomes, inventories, policy):
+    """
+    Probability of every inventory at every step, starting from zero inventory and following policy.
+    :return: Array of shape (n_steps, n_inventories)
+    """
+    occupancy = np.zeros(policy.shape)
+    occupancy[0, len(inventories) // 2] = 1
+    for step in range(policy.shape[0] - 1):
+        for probability, change, _ in outcomes:
+            next_index = np.clip(np.arange(len(inventories)) + change, 0, len(inventories) - 1)
+            np.add.at(occupancy[step + 1], next_index, occupancy[step] * probability[policy[step], 0])
+    return occupancy
+
+
+def observed_states(env, solution):
+    """
+    State number the environment reports for every (step, inventory) of a solution. The state an action is chosen
+    in is the one returned by the previous step, whose time component is the time left before that step.
+    :return: Integer array of shape (n_steps, n_inventories)
+    """
+    steps = np.arange(solution.q_values.shape[0])
+    time_component = env.state_encoder.time_components[np.maximum(steps - 1, 0)]
+    inventory_component = env.state_encoder.inventory_encoder.encode_batch(solution.inventories, 0)
+    return time_component[:, np.newaxis] + inventory_component[np.newaxis, :]
+
+
+def to_q_table(env, solution):
+    """
+    Aggregate optimal action values into the environment's binned states. Every binned state gets the mean of its
+    (step, inventory) states, weighted by how likely the optimal policy is to be in them, or unweighted where that
+    is zero everywhere. Can be used as initial_q of q_learning.
+    :return: QTable
+    """
+    states = observed_states(env, solution).ravel()
+    q_values = solution.q_values.reshape(len(states), -1)
+    Q = QTable.for_env(env)
+
+    filled = np.zeros(Q.n_states, dtype=bool)
+    for weights in (solution.occupancy.ravel(), np.ones(len(states))):
+        totals = np.zeros_like(Q.values)
+        counts = np.zeros(Q.n_states)
+        np.add.at(totals, states, weights[:, np.newaxis] * q_values)
+        np.add.at(counts, states, weights)
+        missing = ~filled & (counts > 0)
+        Q.values[missing] = totals[missing] / counts[missing, np.newaxis]
+        filled |= missing
+    return Q
+
+
+def policy_value(env, Q, solution):
+    """
+    Exact expected discounted return of the greedy policy of a binned Q-table, from the start of an episode. Compare
+    with optimal_value() to measure how far from optimal a learned table is.
+    """
+    actions = np.asarray(Q).argmax(axis=1)[observed_states(env, solution)]
+    inventories = solution.inventories
+    outcomes = _fill_outcomes(env)
+    n_steps = actions.shape[0]
+
+    values = np.zeros(len(inventories))
+    for step in reversed(range(n_steps)):
+        backup = _backup(env, outcomes, inventories, step, n_steps, values, solution.discount_factor)
+        values = backup[actions[step], np.arange(len(inventories))]
+    return float(values[len(inventories) // 2])
+
+
+def optimal_value(solution):
+    """
+    Expected discounted return of the optimal policy, from the start of an episode.
+    """
+    return float(solution.q_values[0, len(solution.inventories) // 2].max())
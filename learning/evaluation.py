@@ -0,0 +1,136 @@
+from collections import namedtuple
+
+import numpy as np
+
+from envs.batch_brown_inventory_time_env import BatchBrownInventoryTimeStateEnv
+from envs.utility import certainty_equivalent
+from learning.stats import EpisodeStats
+
+# Policy taking uniformly random actions, see evaluate()
+RANDOM = "random"
+
+# Results of evaluation episodes. Same fields as EpisodeStats, so plot functions accept it, plus Sharpe ratio of
+# per-step wealth changes of every episode.
+Evaluation = namedtuple("Evaluation", EpisodeStats._fields + ("episode_sharpe",))
+
+
+def compile_policy(Q):
+    """
+    Compile an action-value table into a greedy policy.
+    :param Q: QTable or array of shape (n_states, n_actions)
+    :return: Integer array of shape (n_states,), action for every state
+    """
+    return np.asarray(Q).argmax(axis=1)
+
+
+def zero_tick_policy(env):
+    """
+    :return: Policy always quoting at best bid and ask, as zero_tick agent does
+    """
+    return np.zeros(int(env.observation_space_size), dtype=int)
+
+
+def batch_like(env, n_envs, rng=None):
+    """
+    Build a BatchBrownInventoryTimeStateEnv with parameters and price process of a BrownInventoryTimeStateEnv.
+    :param rng: random generator of fills, fresh one if None
+    """
+    return BatchBrownInventoryTimeStateEnv(n_envs, env.total_time, env.delta_t, env.process, env.a, env.b, rng=rng,
+                                           tick=env.tick, bin_size=env.bin_size, fill_intensity=env.fill_intensity,
+                                           fill_decay=env.fill_decay, terminal_penalty=env.terminal_penalty,
+                                           risk_aversion=env.risk_aversion)
+
+
+def evaluate(policy, env, n_episodes, label=None):
+    """
+    Run episodes of a fixed policy, without exploration nor learning. All n_envs episodes of a batch are stepped in
+    lockstep, and actions are looked up from the policy array with a single index per step.
+    :param policy: QTable or (n_states, n_actions) array, compiled to greedy policy; (n_states,) array of actions;
+    or RANDOM for uniformly random actions
+    :param env: BatchBrownInventoryTimeStateEnv
+    :param n_episodes: number of episodes, last batch is cut off if not a multiple of env.n_envs
+    :param label: label of results
+    :return: Evaluation
+    """
+    if isinstance(policy, str):
+        if policy != RANDOM:
+            raise ValueError("Unknown policy: {}".format(policy))
+    else:
+        policy = np.asarray(policy)
+        if policy.ndim == 2:
+            policy = compile_policy(policy)
+
+    columns = [[] for _ in Evaluation._fields[1:]]
+    for first_episode in range(0, n_episodes, env.n_envs):
+        n = min(env.n_envs, n_episodes - first_episode)
+        for column, values in zip(columns, evaluate_batch(policy, env)):
+            column.append(values[:n])
+
+    return Evaluation(label, *(np.concatenate(column) for column in columns))
+
+
+def evaluate_batch(policy, env, action_rng=None):
+    """
+    Run one batch of episodes of a policy as evaluate() takes it, already compiled to an array of actions or RANDOM.
+    :param action_rng: random generator of RANDOM actions, env.rng if None. A separate one leaves the fill random
+    numbers drawn from env.rng the same for every policy.
+    :return: Arrays of lengths, rewards, final wealths, mean absolute inventories and Sharpe ratios
+    """
+    state = env.reset()
+    episode_rewards = np.zeros(env.n_envs)
+    episode_inventory = np.zeros(env.n_envs)
+
+    # Sums of wealth changes and their squares, for Sharpe ratio
+    wealth = env.value.copy()
+    pnl_sum = np.zeros(env.n_envs)
+    pnl_squares = np.zeros(env.n_envs)
+
+    action_rng = action_rng if action_rng is not None else env.rng
+    t = 0
+    while True:
+        if isinstance(policy, str):
+            action = action_rng.integers(0, env.action_space_size, env.n_envs)
+        else:
+            action = policy[state]
+        state, reward, done, w, i = env.step(action)
+
+        episode_rewards += reward
+        episode_inventory += np.abs(i)
+        pnl = w - wealth
+        pnl_sum += pnl
+        pnl_squares += pnl ** 2
+        wealth = w
+
+        if done[0]:
+            break
+        t += 1
+
+    # Episodes are t + 1 steps long, statistics follow the convention of the training agents
+    n_steps = t + 1
+    mean = pnl_sum / n_steps
+    std = np.sqrt(np.maximum(pnl_squares / n_steps - mean ** 2, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(n_steps), 0.)
+    return np.full(env.n_envs, t), episode_rewards, w, episode_inventory / t, sharpe
+
+
+def summary(evaluation, percentiles=(5, 50, 95), initial_wealth=1000, risk_aversion=None):
+    """
+    Summarize distributions of profit, inventory and Sharpe ratio of an evaluation.
+    :param initial_wealth: wealth at the start of every episode, subtracted from final wealth in overall Sharpe ratio
+    :param risk_aversion: if given, certainty equivalent of final wealths under CARA utility is added
+    :return: Dictionary mapping metric -> {"mean", "std", "p5", ...}, overall Sharpe ratio of episode profits, and
+    certainty equivalent if risk_aversion is given
+    """
+    result = {}
+    for name, values in (("profit", evaluation.episode_profits), ("inventory", evaluation.episode_inventory),
+                         ("sharpe", evaluation.episode_sharpe)):
+        result[name] = {"mean": float(values.mean()), "std": float(values.std())}
+        for p, value in zip(percentiles, np.percentile(values, percentiles)):
+            result[name]["p{}".format(p)] = float(value)
+    profit_std = evaluation.episode_profits.std()
+    profit_mean = evaluation.episode_profits.mean() - initial_wealth
+    result["profit_sharpe"] = float(profit_mean / profit_std) if profit_std else 0.
+    if risk_aversion is not None:
+        result["certainty_equivalent"] = float(certainty_equivalent(evaluation.episode_profits, risk_aversion))
+    return result
@@ -0,0 +1,128 @@
+import json
+import os
+from collections import namedtuple
+
+from learning.config import EnvConfig, LearnerConfig
+from learning.runner import AGENTS, check_agents, job_filename, load_stats, make_jobs, run_jobs
+
+# One experiment of a manifest: every agent is run for every seed on the same environment config
+Experiment = namedtuple("Experiment", ["name", "env_config", "learner_config", "agents", "episodes", "seeds",
+                                       "workers", "root_seed", "output_dir"])
+
+# Settings of an experiment in a manifest, with defaults. "env" and "learner" map to EnvConfig and LearnerConfig.
+MANIFEST_DEFAULTS = {
+    "name": "experiment",
+    "env": {},
+    "learner": {},
+    "agents": ["q_learning", "zero_tick", "random_actions"],
+    "episodes": 1000,
+    "seeds": 1,
+    "workers": None,
+    "root_seed": 0,
+    "output_dir": None,
+}
+
+
+def load_manifest(filename):
+    """
+    Read experiments from a JSON or YAML (.yml, .yaml, needs PyYAML) manifest. A manifest holds either settings of
+    one experiment, or a list of experiments under "experiments", in which case settings at top level are shared by
+    all of them and every experiment may override them.
+    :return: list of Experiment
+    """
+    with open(filename) as f:
+        if filename.endswith((".yml", ".yaml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is needed to read YAML manifests, use JSON or install it") from None
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+
+    experiments = manifest.pop("experiments", None)
+    if experiments is None:
+        return [parse_experiment(manifest)]
+    return [parse_experiment(_merge(manifest, spec)) for spec in experiments]
+
+
+def _merge(shared, spec):
+    """
+    Settings of one experiment over shared ones, env and learner parameters are merged one by one.
+    """
+    merged = dict(shared, **spec)
+    for section in ("env", "learner"):
+        merged[section] = dict(shared.get(section, {}), **spec.get(section, {}))
+    return merged
+
+
+def parse_experiment(spec):
+    """
+    Build an Experiment from its manifest settings, unknown settings and parameters raise ValueError.
+    :param spec: dictionary of settings, see MANIFEST_DEFAULTS
+    :return: Experiment
+    """
+    unknown = set(spec) - set(MANIFEST_DEFAULTS)
+    if unknown:
+        raise ValueError("Unknown settings: {}".format(", ".join(sorted(unknown))))
+    spec = dict(MANIFEST_DEFAULTS, **spec)
+
+    for section, config in (("env", EnvConfig), ("learner", LearnerConfig)):
+        unknown = set(spec[section]) - set(config._fields)
+        if unknown:
+            raise ValueError("Unknown {} parameters: {}".format(section, ", ".join(sorted(unknown))))
+    unknown = set(spec["agents"]) - set(AGENTS)
+    if unknown:
+        raise ValueError("Unknown agents: {}".format(", ".join(sorted(unknown))))
+
+    env_config = EnvConfig(**spec["env"])
+    check_agents(spec["agents"], env_config)
+
+    return Experiment(
+        name=spec["name"],
+        env_config=env_config,
+        learner_config=LearnerConfig(**spec["learner"]),
+        agents=list(spec["agents"]),
+        episodes=int(spec["episodes"]),
+        seeds=spec["seeds"] if isinstance(spec["seeds"], int) else list(spec["seeds"]),
+        workers=spec["workers"],
+        root_seed=spec["root_seed"],
+        output_dir=spec["output_dir"] or os.path.join("results", spec["name"]),
+    )
+
+
+def experiment_jobs(experiment):
+    """
+    :return: list of Job, one for every (agent, seed) combination
+    """
+    return make_jobs(experiment.agents, experiment.seeds, (experiment.env_config,), experiment.learner_config)
+
+
+def run_experiment(experiment, executor=None):
+    """
+    Run all jobs of an experiment, reusing results already in its output directory.
+    :param executor: existing process pool, see learning.runner.run_jobs
+    :return: list of EpisodeStats, in order of experiment_jobs()
+    """
+    return run_jobs(experiment_jobs(experiment), experiment.episodes, experiment.output_dir, experiment.workers,
+                    experiment.root_seed, executor=executor)
+
+
+def experiment_filenames(experiment):
+    """
+    :return: list of statistics filenames, in order of experiment_jobs()
+    """
+    return [job_filename(job, experiment.episodes, experiment.output_dir, experiment.root_seed)
+            for job in experiment_jobs(experiment)]
+
+
+def load_experiment(experiment):
+    """
+    Load statistics of an experiment that was already run, without running anything.
+    :return: list of EpisodeStats, in order of experiment_jobs()
+    """
+    filenames = experiment_filenames(experiment)
+    missing = [filename for filename in filenames if not os.path.exists(filename)]
+    if missing:
+        raise FileNotFoundError("Experiment {} has not been run, missing {}".format(experiment.name, missing[0]))
+    return [load_stats(filename) for filename in filenames]
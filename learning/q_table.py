@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class QTable:
+    """
+    Tabular action-value function backed by a dense (n_states, n_actions) array. States and actions are integers,
+    so every lookup is a plain array index.
+    """
+
+    def __init__(self, n_states, n_actions, values=None):
+        self.values = np.zeros((n_states, n_actions)) if values is None else values
+
+    @classmethod
+    def for_env(cls, env):
+        """
+        Create an all-zero table covering observation and action space of given environment.
+        """
+        return cls(int(env.observation_space_size), int(env.action_space_size))
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load table saved with save().
+        """
+        values = np.load(filename)
+        return cls(values.shape[0], values.shape[1], values)
+
+    @property
+    def n_states(self):
+        return self.values.shape[0]
+
+    @property
+    def n_actions(self):
+        return self.values.shape[1]
+
+    def __getitem__(self, state):
+        return self.values[state]
+
+    def __array__(self, dtype=None, copy=None):
+        return self.values if dtype is None else self.values.astype(dtype)
+
+    def greedy(self, state):
+        """
+        :return: Action with the highest value in given state
+        """
+        return int(self.values[state].argmax())
+
+    def epsilon_greedy(self, state, epsilon):
+        """
+        With probability epsilon take a uniformly random action, greedy one otherwise. Same distribution as the
+        probability vector of make_epsilon_greedy_policy, without allocating it.
+        :return: Chosen action
+        """
+        if np.random.random() < epsilon:
+            return np.random.randint(self.n_actions)
+        return self.greedy(state)
+
+    def save(self, filename):
+        """
+        Save table values to a .npy file.
+        """
+        np.save(filename, self.values)
@@ -0,0 +1,329 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from learning.stats import EpisodeStats
+
+# Columns of per-episode statistics, same as fields of EpisodeStats
+EPISODE_COLUMNS = EpisodeStats._fields[1:]
+
+# Columns of optional per-step traces. Price, wealth and inventory are the ones after the step.
+STEP_COLUMNS = ("episode", "step", "action", "price", "reward", "wealth", "inventory")
+
+
+class MemoryRecorder:
+    """
+    Keeps per-episode statistics in preallocated arrays, which requires number of episodes to be known up front.
+    Agents use it when no other recorder is given. Per-step traces are not recorded.
+    """
+
+    record_steps = False
+
+    def __init__(self):
+        self.stats = None
+        self.n = 0
+
+    def begin(self, label, num_episodes):
+        """
+        Prepare for recording num_episodes episodes of an agent with given label.
+        """
+        self.stats = EpisodeStats(label, *(np.zeros(num_episodes) for _ in EPISODE_COLUMNS))
+        self.n = 0
+
+    def record_episode(self, length, reward, profit, inventory):
+        """
+        Record statistics of one finished episode.
+        """
+        self.stats.episode_lengths[self.n] = length
+        self.stats.episode_rewards[self.n] = reward
+        self.stats.episode_profits[self.n] = profit
+        self.stats.episode_inventory[self.n] = inventory
+        self.n += 1
+
+    def record_episodes(self, lengths, rewards, profits, inventory):
+        """
+        Record statistics of several finished episodes, given as arrays.
+        """
+        n = len(profits)
+        for column, values in zip(self.stats[1:], (lengths, rewards, profits, inventory)):
+            column[self.n:self.n + n] = values
+        self.n += n
+
+    def episode_stats(self):
+        """
+        :return: EpisodeStats of all recorded episodes
+        """
+        return self.stats
+
+    def checkpoint_state(self):
+        """
+        :return: Picklable state to continue recording from, copies of recorded statistics as they live only here
+        """
+        return tuple(column[:self.n].copy() for column in self.stats[1:])
+
+    def restore_state(self, label, num_episodes, state):
+        """
+        Begin recording again after episodes of a checkpoint_state(), in place of begin().
+        """
+        self.begin(label, num_episodes)
+        for column, values in zip(self.stats[1:], state):
+            column[:len(values)] = values
+        self.n = len(state[0])
+
+
+class StatsRecorder:
+    """
+    Streams per-episode statistics, and optionally per-step traces, to a directory of chunked columnar .npy files.
+    Only the current chunk of every table is held in memory, so neither number of episodes has to be known up front
+    nor does memory grow with the length of the run. Use StatsReader to read the results back lazily. Every run
+    starts with begin(), which replaces statistics already in the directory, or restore_state() to continue them.
+    """
+
+    def __init__(self, directory, chunk_size=65536, record_steps=False):
+        self.directory = directory
+        self.record_steps = record_steps
+        os.makedirs(directory, exist_ok=True)
+
+        self._episodes = _ChunkedTable(os.path.join(directory, "episodes"), EPISODE_COLUMNS, chunk_size)
+        self._steps = _ChunkedTable(os.path.join(directory, "steps"), STEP_COLUMNS, chunk_size) \
+            if record_steps else None
+
+    def begin(self, label, num_episodes=None):
+        """
+        Store label of the agent being recorded, and delete statistics of any earlier run in the directory. Number of
+        episodes is not needed.
+        """
+        self._episodes.clear()
+        if self._steps is not None:
+            self._steps.clear()
+        else:
+            _remove_chunks(os.path.join(self.directory, "steps"), STEP_COLUMNS)
+        self._write_meta(label)
+
+    def _write_meta(self, label):
+        with open(os.path.join(self.directory, "meta.json"), "w") as f:
+            json.dump({"label": label}, f)
+
+    def record_episode(self, length, reward, profit, inventory):
+        """
+        Record statistics of one finished episode.
+        """
+        self._episodes.append((length, reward, profit, inventory))
+
+    def record_episodes(self, lengths, rewards, profits, inventory):
+        """
+        Record statistics of several finished episodes, given as arrays.
+        """
+        self._episodes.extend(np.column_stack((lengths, rewards, profits, inventory)))
+
+    def record_step(self, episode, step, action, price, reward, wealth, inventory):
+        """
+        Record trace of one step. Does nothing unless recorder was created with record_steps.
+        """
+        if self._steps is not None:
+            self._steps.append((episode, step, action, price, reward, wealth, inventory))
+
+    def record_steps_batch(self, episodes, step, actions, prices, rewards, wealths, inventory):
+        """
+        Record traces of one step of several episodes, given as arrays.
+        """
+        if self._steps is not None:
+            self._steps.extend(np.column_stack((episodes, np.full(len(episodes), step), actions, prices, rewards,
+                                                wealths, inventory)))
+
+    def close(self):
+        """
+        Write remaining buffered records.
+        """
+        self._episodes.flush()
+        if self._steps is not None:
+            self._steps.flush()
+
+    def episode_stats(self):
+        """
+        Flush buffers and read recorded statistics back lazily.
+        :return: EpisodeStats with LazyColumn fields
+        """
+        self.close()
+        return StatsReader(self.directory).episode_stats()
+
+    def checkpoint_state(self):
+        """
+        :return: Picklable state to continue recording from: number of chunks written and rows still buffered, so
+        its size is bounded by chunk size and nothing is flushed
+        """
+        return {"episodes": self._episodes.state(),
+                "steps": self._steps.state() if self._steps is not None else None}
+
+    def restore_state(self, label, num_episodes, state):
+        """
+        Begin recording again after rows of a checkpoint_state(), in place of begin(). Chunks written before the
+        checkpoint are kept and the ones written after it are deleted, so resuming into the same directory does not
+        record episodes twice.
+        """
+        self._write_meta(label)
+        self._episodes.restore(state["episodes"])
+        if self._steps is not None:
+            if state["steps"] is None:
+                raise ValueError("Checkpoint has no step traces to continue")
+            self._steps.restore(state["steps"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _ChunkedTable:
+    """
+    Fixed-size row buffer, written out column by column as numbered .npy chunks whenever it fills up.
+    """
+
+    def __init__(self, directory, columns, chunk_size):
+        self.directory = directory
+        self.columns = columns
+        self.buffer = np.empty((chunk_size, len(columns)))
+        self.n = 0
+        os.makedirs(directory, exist_ok=True)
+        self.chunk = 0
+
+    def append(self, row):
+        self.buffer[self.n] = row
+        self.n += 1
+        if self.n == len(self.buffer):
+            self.flush()
+
+    def extend(self, rows):
+        while len(rows):
+            n = min(len(rows), len(self.buffer) - self.n)
+            self.buffer[self.n:self.n + n] = rows[:n]
+            self.n += n
+            rows = rows[n:]
+            if self.n == len(self.buffer):
+                self.flush()
+
+    def flush(self):
+        if self.n == 0:
+            return
+        for j, column in enumerate(self.columns):
+            np.save(os.path.join(self.directory, "{}.{:06d}.npy".format(column, self.chunk)), self.buffer[:self.n, j])
+        self.chunk += 1
+        self.n = 0
+
+    def state(self):
+        return self.chunk, self.buffer[:self.n].copy()
+
+    def restore(self, state):
+        chunk, rows = state
+        _remove_chunks(self.directory, self.columns, chunk)
+        self.chunk = chunk
+        self.n = 0
+        self.extend(rows)
+
+    def clear(self):
+        self.restore((0, self.buffer[:0]))
+
+
+def _remove_chunks(directory, columns, first_chunk=0):
+    """
+    Delete chunks of a table from given chunk number on.
+    """
+    for column in columns:
+        for filename in glob.glob(os.path.join(directory, column + ".*.npy")):
+            if int(filename.split(".")[-2]) >= first_chunk:
+                os.remove(filename)
+
+
+class StatsReader:
+    """
+    Read statistics written by StatsRecorder. Columns are returned as LazyColumn objects, which read their chunks
+    only when accessed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        meta_file = os.path.join(directory, "meta.json")
+        self.label = None
+        if os.path.exists(meta_file):
+            with open(meta_file) as f:
+                self.label = json.load(f)["label"]
+
+    def column(self, name, table="episodes"):
+        """
+        :param name: column name
+        :param table: "episodes" or "steps"
+        :return: LazyColumn
+        """
+        return LazyColumn(sorted(glob.glob(os.path.join(self.directory, table, name + ".*.npy"))))
+
+    def episode_stats(self):
+        """
+        :return: EpisodeStats with LazyColumn fields
+        """
+        return EpisodeStats(self.label, *(self.column(name) for name in EPISODE_COLUMNS))
+
+    def steps(self, columns=STEP_COLUMNS):
+        """
+        Iterate over per-step traces chunk by chunk.
+        :return: generator of dictionaries mapping column name -> memory-mapped chunk
+        """
+        lazy_columns = [self.column(name, "steps") for name in columns]
+        for chunks in zip(*(column.iter_chunks() for column in lazy_columns)):
+            yield dict(zip(columns, chunks))
+
+
+class LazyColumn:
+    """
+    One column of a chunked table. Chunks are memory-mapped one at a time when iterated over, the whole column is
+    only read when converted to an array.
+    """
+
+    def __init__(self, filenames):
+        self.filenames = filenames
+        self._lengths = None
+
+    def iter_chunks(self):
+        """
+        :return: generator of memory-mapped chunks
+        """
+        for filename in self.filenames:
+            yield np.load(filename, mmap_mode="r")
+
+    @property
+    def lengths(self):
+        if self._lengths is None:
+            self._lengths = [chunk.shape[0] for chunk in self.iter_chunks()]
+        return self._lengths
+
+    def __len__(self):
+        return sum(self.lengths)
+
+    def read(self):
+        """
+        Read whole column into one array, filled chunk by chunk.
+        """
+        out = np.empty(len(self))
+        start = 0
+        for chunk in self.iter_chunks():
+            out[start:start + len(chunk)] = chunk
+            start += len(chunk)
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        return self.read() if dtype is None else self.read().astype(dtype)
+
+    def __getitem__(self, index):
+        return self.read()[index]
+
+    def sum(self):
+        return sum(float(chunk.sum()) for chunk in self.iter_chunks())
+
+    def mean(self):
+        return self.sum() / len(self)
+
+    def std(self):
+        mean = self.mean()
+        return np.sqrt(sum(float(((chunk - mean) ** 2).sum()) for chunk in self.iter_chunks()) / len(self))
@@ -0,0 +1,172 @@
+import os
+import random
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from learning.agents import avellaneda_stoikov, double_q_learning, q_lambda, q_learning, random_actions, zero_tick
+from learning.config import EnvConfig, LearnerConfig, config_hash, make_env
+from learning.stats import EpisodeStats
+
+# Agents that can be referenced by name in a job
+AGENTS = {
+    "q_learning": q_learning,
+    "q_lambda": q_lambda,
+    "double_q_learning": double_q_learning,
+    "zero_tick": zero_tick,
+    "random_actions": random_actions,
+    "avellaneda_stoikov": avellaneda_stoikov,
+}
+
+# Agents that accept LearnerConfig parameters
+LEARNING_AGENTS = {"q_learning", "q_lambda", "double_q_learning"}
+
+# Agents that read price volatility and fill decay of the env, which only BrownInventoryTimeStateEnv has
+PROCESS_AGENTS = {"avellaneda_stoikov"}
+
+Job = namedtuple("Job", ["agent", "seed", "env_config", "learner_config"], defaults=[EnvConfig(), LearnerConfig()])
+
+
+def make_jobs(agents, seeds, env_configs=(EnvConfig(),), learner_config=LearnerConfig()):
+    """
+    Create a job for every (agent, seed, env config) combination.
+    :param agents: names of agents, keys of AGENTS
+    :param seeds: number of seeds, or iterable of seed indices
+    :param env_configs: iterable of EnvConfig
+    :param learner_config: LearnerConfig used by learning agents
+    :return: list of Job
+    """
+    env_configs = list(env_configs)
+    for config in env_configs:
+        check_agents(agents, config)
+    if isinstance(seeds, int):
+        seeds = range(seeds)
+    return [Job(agent, seed, config, learner_config)
+            for config in env_configs for seed in seeds for agent in agents]
+
+
+def check_agents(agents, env_config):
+    """
+    Check that agents can run on the environment of an EnvConfig, so that incompatible jobs fail before any worker
+    starts.
+    :raises ValueError: if an agent needs what the environment class does not have
+    """
+    unsupported = sorted(set(agents) & PROCESS_AGENTS) if env_config.env_class != "BrownInventoryTimeStateEnv" else []
+    if unsupported:
+        raise ValueError("Agents {} need BrownInventoryTimeStateEnv, not {}".format(", ".join(unsupported),
+                                                                                  env_config.env_class))
+
+
+def _write_atomic(filename, write):
+    """
+    Write a file under a unique temporary name in its directory and then move it in place, so a killed worker never
+    leaves a truncated file behind and workers writing the same file never share a temporary one.
+    :param write: function taking the open binary file
+    """
+    fd, tmp_filename = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(filename) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def save_stats(stats, filename):
+    """
+    Save EpisodeStats to an .npz file, atomically.
+    """
+    _write_atomic(filename, lambda f: np.savez(f, label=stats.label,
+                                               **{field: getattr(stats, field) for field in EpisodeStats._fields[1:]}))
+
+
+def load_stats(filename):
+    """
+    Load EpisodeStats saved with save_stats().
+    """
+    with np.load(filename) as data:
+        return EpisodeStats(str(data["label"]), *(data[field] for field in EpisodeStats._fields[1:]))
+
+
+def _quiet(episode, num_episodes):
+    """Progress callback that prints nothing, as workers would interleave their progress lines on one stdout."""
+    pass
+
+
+def run_job(job, num_episodes, filename, root_seed=0):
+    """
+    Run one job and save its statistics. Randomness comes from the SeedSequence spawned from root_seed at position
+    job.seed, so different seeds are independent while every agent with the same seed sees the same streams.
+    :return: filename of saved statistics
+    """
+    seed_sequence = np.random.SeedSequence(root_seed, spawn_key=(job.seed,))
+    python_seed, numpy_seed, process_seed = seed_sequence.spawn(3)
+
+    # Environments and agents still use the global random states, so every worker seeds its own copies
+    random.seed(int(python_seed.generate_state(1)[0]))
+    np.random.seed(numpy_seed.generate_state(4))
+    env = make_env(job.env_config, np.random.default_rng(process_seed))
+
+    kwargs = job.learner_config._asdict() if job.agent in LEARNING_AGENTS else {}
+    Q, stats = AGENTS[job.agent](env, num_episodes, progress=_quiet, **kwargs)
+
+    if Q is not None:
+        _write_atomic(q_filename(filename), Q.save)
+    save_stats(stats, filename)
+    return filename
+
+
+def q_filename(filename):
+    """
+    File the Q-table of a learning agent's job is saved to, next to its statistics file.
+    """
+    return os.path.splitext(filename)[0] + "_q.npy"
+
+
+def job_filename(job, num_episodes, output_dir, root_seed=0):
+    """
+    Statistics file of a job, named by hash of everything that determines its results.
+    """
+    key = config_hash(job.agent, job.seed, job.env_config, job.learner_config, num_episodes, root_seed)
+    return os.path.join(output_dir, "{}_seed{}_{}.npz".format(job.agent, job.seed, key))
+
+
+def run_jobs(jobs, num_episodes, output_dir, workers=None, root_seed=0, cache=True, executor=None):
+    """
+    Run jobs on a pool of worker processes. Workers exchange statistics through .npz files in output_dir, only their
+    filenames are sent back.
+    :param jobs: list of Job
+    :param num_episodes: number of episodes every agent is run for
+    :param output_dir: directory for statistics files, created if missing
+    :param workers: number of worker processes, all cores if None
+    :param root_seed: seed all job seeds are spawned from
+    :param cache: reuse statistics files already in output_dir instead of running their jobs again
+    :param executor: existing pool to run jobs on, so that several runs share worker processes; workers is then
+    ignored
+    :return: list of EpisodeStats, in order of jobs
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+
+    # Jobs with identical configs share a file, and are run only once
+    filenames = [job_filename(job, num_episodes, output_dir, root_seed) for job in jobs]
+    pending = {filename: job for job, filename in zip(jobs, filenames) if not (cache and os.path.exists(filename))}
+    pending = [(job, filename) for filename, job in pending.items()]
+
+    if pending and executor is not None:
+        _run_pending(executor, pending, num_episodes, root_seed)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            _run_pending(executor, pending, num_episodes, root_seed)
+
+    return [load_stats(filename) for filename in filenames]
+
+
+def _run_pending(executor, pending, num_episodes, root_seed):
+    futures = [executor.submit(run_job, job, num_episodes, filename, root_seed) for job, filename in pending]
+    for future in futures:
+        future.result()
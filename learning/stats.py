@@ -0,0 +1,5 @@
+from collections import namedtuple
+
+# Per-episode statistics of one agent, every field but label is an array with one value per episode
+EpisodeStats = namedtuple("EpisodeStats",
+                          ["label", "episode_lengths", "episode_rewards", "episode_profits", "episode_inventory"])
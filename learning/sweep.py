@@ -0,0 +1,105 @@
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+from learning.config import split_params
+from learning.runner import Job, run_jobs
+
+Trial = namedtuple("Trial", ["params", "score", "stats"])
+
+
+def profit_score(statlist):
+    """
+    Mean episode profit over the second half of episodes, averaged over seeds. Early episodes are left out since the
+    agent is still exploring.
+    """
+    return float(np.mean([s.episode_profits[len(s.episode_profits) // 2:].mean() for s in statlist]))
+
+
+def grid(space):
+    """
+    All combinations of parameter values.
+    :param space: dictionary mapping parameter name -> list of values
+    :return: list of parameter dictionaries
+    """
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def sample(space, n_samples, rng=None):
+    """
+    Random parameter combinations.
+    :param space: dictionary mapping parameter name -> list of values to choose from, or (low, high) tuple to sample
+    uniformly from
+    :param n_samples: number of combinations
+    :param rng: numpy random generator or seed
+    :return: list of parameter dictionaries
+    """
+    rng = np.random.default_rng(rng)
+    samples = []
+    for _ in range(n_samples):
+        params = {}
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, tuple):
+                params[name] = float(rng.uniform(*values))
+            else:
+                params[name] = values[rng.integers(len(values))]
+        samples.append(params)
+    return samples
+
+
+def evaluate(param_list, num_episodes, agent="q_learning", seeds=1, output_dir="sweep_cache", workers=None,
+             root_seed=0, score=profit_score):
+    """
+    Run every parameter combination for given number of seeds, in parallel. Results are cached in output_dir, keyed
+    by config hash, so combinations already evaluated are only loaded.
+    :return: list of Trial, best score first
+    """
+    jobs = []
+    for params in param_list:
+        env_config, learner_config = split_params(params)
+        jobs.extend(Job(agent, seed, env_config, learner_config) for seed in range(seeds))
+
+    stats = run_jobs(jobs, num_episodes, output_dir, workers, root_seed)
+
+    trials = [Trial(params, score(stats[i * seeds:(i + 1) * seeds]), stats[i * seeds:(i + 1) * seeds])
+              for i, params in enumerate(param_list)]
+    return sorted(trials, key=lambda trial: trial.score, reverse=True)
+
+
+def grid_search(space, num_episodes, **kwargs):
+    """
+    Evaluate all combinations of parameter values. Keyword arguments are passed to evaluate().
+    :return: list of Trial, best score first
+    """
+    return evaluate(grid(space), num_episodes, **kwargs)
+
+
+def random_search(space, n_trials, num_episodes, rng=None, **kwargs):
+    """
+    Evaluate randomly sampled parameter combinations. Keyword arguments are passed to evaluate().
+    :return: list of Trial, best score first
+    """
+    return evaluate(sample(space, n_trials, rng), num_episodes, **kwargs)
+
+
+def successive_halving(space, min_episodes, max_episodes, eta=3, **kwargs):
+    """
+    Evaluate all combinations on a small number of episodes, keep the best 1/eta of them and evaluate those on eta
+    times more episodes, until max_episodes is reached or one combination is left. Poor combinations are thus stopped
+    early, based on their partial statistics. Keyword arguments are passed to evaluate().
+    :param space: dictionary mapping parameter name -> list of values, or list of parameter dictionaries
+    :return: list of Trial of the last round, best score first
+    """
+    candidates = grid(space) if isinstance(space, dict) else list(space)
+    num_episodes = min_episodes
+
+    while True:
+        trials = evaluate(candidates, num_episodes, **kwargs)
+        if num_episodes >= max_episodes or len(trials) == 1:
+            return trials
+
+        candidates = [trial.params for trial in trials[:max(1, len(trials) // eta)]]
+        num_episodes = min(num_episodes * eta, max_episodes)
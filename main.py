@@ -1,44 +1,285 @@
+"""
+Without arguments, runs the default comparison of agents. Experiments described by JSON or YAML manifests (see
+learning.experiment) are run with subcommands:
+
+    python main.py train experiments.json more.yaml --workers 8
+    python main.py evaluate experiments.json --episodes 10000
+    python main.py compare experiments.json --confidence 0.95 --budget 100000
+    python main.py plot experiments.json
+    python main.py benchmark --scale 0.1
+"""
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
 from envs.brown_inventory_time_env import BrownInventoryTimeStateEnv
 from learning.agents import *
+from learning.aggregates import OnlineAggregate
+from learning.comparison import compare, report
+from learning.config import make_env
+from learning.evaluation import RANDOM, batch_like, compile_policy, evaluate, summary, zero_tick_policy
+from learning.experiment import experiment_filenames, experiment_jobs, load_experiment, load_manifest, run_experiment
+from learning.q_table import QTable
+from learning.recorder import MemoryRecorder
+from learning.runner import LEARNING_AGENTS, q_filename
 from models.brownian_model import StochasticProcess
-from plotting import plot_utils
+from models.path_bank import PathBank
 
 
 def main():
 
     n_ep = 1000
-    env = BrownInventoryTimeStateEnv(1, 0.005, StochasticProcess(1, 0.005, 2, 100), 4, 1)
-    q, stats = q_learning(env, n_ep)
-    _, stats2 = zero_tick(env, n_ep)
-    _, stats3 = random_actions(env, n_ep)
+
+    # All agents are run on the same price paths, generated only once
+    bank = PathBank.from_process(StochasticProcess(1, 0.005, 2, 100), n_ep)
+    paths = bank.replay()
+    env = BrownInventoryTimeStateEnv(1, 0.005, paths, 4, 1)
+
+    # Summary statistics are aggregated online, full statistics are kept for plots
+    aggregates = [OnlineAggregate(MemoryRecorder()) for _ in range(4)]
+    paths.seek(0)
+    q, stats = q_learning(env, n_ep, recorder=aggregates[0])
+    paths.seek(0)
+    _, stats2 = zero_tick(env, n_ep, recorder=aggregates[1])
+    paths.seek(0)
+    _, stats3 = random_actions(env, n_ep, recorder=aggregates[2])
+    paths.seek(0)
+    _, stats4 = avellaneda_stoikov(env, n_ep, sigma=2, recorder=aggregates[3])
     print()
 
+    # Plotting stack is only loaded once there is something to plot, figures are saved to PLOT_DIR if it is set
+    from plotting import plot_utils
+
     plot_utils.plot_episode_rewards(stats, 50)
     plot_utils.plot_episode_profit(stats)
     plot_utils.plot_episode_inventory(stats)
 
     plot_utils.plot_value_heatmap(q)
 
-    print("Profit means, Q, Zero, Random")
-    print(stats.episode_profits.mean())
-    print(stats2.episode_profits.mean())
-    print(stats3.episode_profits.mean())
-    print("Profit SDs, Q, Zero, Random")
-    print(stats.episode_profits.std())
-    print(stats2.episode_profits.std())
-    print(stats3.episode_profits.std())
-    print("Inventory means, Q, Zero, Random")
-    print(stats.episode_inventory.mean())
-    print(stats2.episode_inventory.mean())
-    print(stats3.episode_inventory.mean())
-    print("Inventory SDs, Q, Zero, Random")
-    print(stats.episode_inventory.std())
-    print(stats2.episode_inventory.std())
-    print(stats3.episode_inventory.std())
-
-    plot_utils.plot_relative_profits([stats, stats2, stats3], 1)
-    plot_utils.plot_relative_invs([stats, stats2, stats3], 1)
+    print("Profit means, Q, Zero, Random, AS")
+    for aggregate in aggregates:
+        print(aggregate.profit.mean)
+    print("Profit SDs, Q, Zero, Random, AS")
+    for aggregate in aggregates:
+        print(aggregate.profit.std)
+    print("Inventory means, Q, Zero, Random, AS")
+    for aggregate in aggregates:
+        print(aggregate.inventory.mean)
+    print("Inventory SDs, Q, Zero, Random, AS")
+    for aggregate in aggregates:
+        print(aggregate.inventory.std)
+
+    plot_utils.plot_relative_profits([stats, stats2, stats3, stats4], 1)
+    plot_utils.plot_relative_invs([stats, stats2, stats3, stats4], 1)
+
+    # Learned greedy policy and baselines, compared on fresh paths without exploration until their ranking is decided
+    batch_env = batch_like(env, 1000)
+    batch_env.process = StochasticProcess(1, 0.005, 2, 100)
+    print("Evaluation")
+    for line in report(compare([q, zero_tick_policy(env), RANDOM], batch_env, ["Q", "Zero", "Random"])):
+        print(line)
+
+
+def train_command(experiments, workers=None):
+    """
+    Run experiments one after another, all on the same pool of worker processes.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for experiment in experiments:
+            print("Training {}".format(experiment.name))
+            statlist = run_experiment(experiment, executor)
+
+            # Means over all episodes and seeds of every agent
+            profits = defaultdict(list)
+            inventory = defaultdict(list)
+            for job, stats in zip(experiment_jobs(experiment), statlist):
+                profits[job.agent].append(np.mean(stats.episode_profits))
+                inventory[job.agent].append(np.mean(stats.episode_inventory))
+            for agent in experiment.agents:
+                print("  {:<20} profit {:10.3f}  inventory {:7.3f}".format(agent, np.mean(profits[agent]),
+                                                                           np.mean(inventory[agent])))
+
+
+def _policy(agent, filename, env):
+    """
+    Policy of a trained job for learning.evaluation.evaluate, None for agents that cannot be evaluated that way.
+    """
+    if os.path.exists(q_filename(filename)):
+        return QTable.load(q_filename(filename))
+    elif agent == "zero_tick":
+        return zero_tick_policy(env)
+    elif agent == "random_actions":
+        return RANDOM
+    return None
+
+
+def _same_policy(policy, other):
+    """
+    Whether two policies of _policy() take the same actions, Q-tables being compared by their greedy policies.
+    """
+    if isinstance(policy, str) or isinstance(other, str):
+        return policy == other if isinstance(policy, str) and isinstance(other, str) else False
+    policy, other = np.asarray(policy), np.asarray(other)
+    policy = compile_policy(policy) if policy.ndim == 2 else policy
+    other = compile_policy(other) if other.ndim == 2 else other
+    return np.array_equal(policy, other)
+
+
+def evaluate_command(experiments, num_episodes, n_envs):
+    """
+    Evaluate greedy policies of trained experiments, and baselines, on fresh paths. Summaries are printed and written
+    to evaluation.json in the output directory of every experiment.
+    """
+    for experiment in experiments:
+        if experiment.env_config.env_class != "BrownInventoryTimeStateEnv":
+            raise ValueError("Batch evaluation needs BrownInventoryTimeStateEnv, not {}".format(
+                experiment.env_config.env_class))
+        load_experiment(experiment)
+
+        print("Evaluating {}".format(experiment.name))
+        env = make_env(experiment.env_config, np.random.default_rng(experiment.root_seed))
+        batch_env = batch_like(env, n_envs, np.random.default_rng(experiment.root_seed))
+        results = {}
+        for job, filename in zip(experiment_jobs(experiment), experiment_filenames(experiment)):
+            policy = _policy(job.agent, filename, env)
+            if policy is None:
+                print("  {:<20} seed {:3d}  skipped, no tabular policy".format(job.agent, job.seed))
+                continue
+            result = summary(evaluate(policy, batch_env, num_episodes, job.agent), risk_aversion=env.risk_aversion)
+            results["{}/seed{}".format(job.agent, job.seed)] = result
+            print("  {:<20} seed {:3d}  profit {:10.3f}  inventory {:7.3f}  sharpe {:7.3f}".format(
+                job.agent, job.seed, result["profit"]["mean"], result["inventory"]["mean"], result["sharpe"]["mean"]))
+
+        with open(os.path.join(experiment.output_dir, "evaluation.json"), "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def compare_command(experiments, confidence, budget, n_envs):
+    """
+    Compare greedy policies of trained experiments, and baselines, on shared fresh paths until their ranking is
+    decided or the budget is spent. Every seed of a learning agent is compared separately, but identical policies only
+    once: baselines, which are the same for every seed, and seeds that ended with the same greedy policy. Results are
+    printed and written to comparison.json in the output directory of every experiment.
+    """
+    for experiment in experiments:
+        if experiment.env_config.env_class != "BrownInventoryTimeStateEnv":
+            raise ValueError("Batch evaluation needs BrownInventoryTimeStateEnv, not {}".format(
+                experiment.env_config.env_class))
+        load_experiment(experiment)
+
+        print("Comparing {}".format(experiment.name))
+        env = make_env(experiment.env_config, np.random.default_rng(experiment.root_seed))
+        batch_env = batch_like(env, n_envs, np.random.default_rng(experiment.root_seed))
+        labels, policies = [], []
+        for job, filename in zip(experiment_jobs(experiment), experiment_filenames(experiment)):
+            policy = _policy(job.agent, filename, env)
+            if policy is None:
+                continue
+            learned = isinstance(policy, QTable)
+            same = [label for label, other in zip(labels, policies) if _same_policy(policy, other)]
+            if same:
+                if learned:
+                    print("  {}/seed{} skipped, same policy as {}".format(job.agent, job.seed, same[0]))
+                continue
+            labels.append("{}/seed{}".format(job.agent, job.seed) if learned else job.agent)
+            policies.append(policy)
+        if len(policies) < 2:
+            print("  skipped, {} distinct tabular policies where at least two are needed".format(len(policies)))
+            continue
+
+        comparison = compare(policies, batch_env, labels, confidence=confidence, budget=budget)
+        for line in report(comparison):
+            print("  " + line)
+
+        result = {"n_episodes": comparison.n_episodes, "confidence": confidence}
+        for metric, ranking in comparison.ranking.items():
+            result[metric] = {
+                "ranking": ranking,
+                "decided": comparison.decided[metric],
+                "means": dict(zip(labels, comparison.means[metric].tolist())),
+                "intervals": {"{} - {}".format(labels[i], labels[j]): interval
+                              for (i, j), interval in comparison.intervals[metric].items()},
+            }
+        with open(os.path.join(experiment.output_dir, "comparison.json"), "w") as f:
+            json.dump(result, f, indent=2)
+
+
+def plot_command(experiments, show=False):
+    """
+    Plot statistics of trained experiments, for their first seed. Figures are saved to the plots directory in the
+    output directory of every experiment, unless show is set.
+    """
+    from plotting import plot_utils
+
+    for experiment in experiments:
+        if not show:
+            plot_utils.headless(os.path.join(experiment.output_dir, "plots"))
+        jobs = experiment_jobs(experiment)
+        first_seed = jobs[0].seed
+        statlist = [stats for job, stats in zip(jobs, load_experiment(experiment)) if job.seed == first_seed]
+
+        referent = experiment.agents.index("zero_tick") if "zero_tick" in experiment.agents else 0
+        plot_utils.plot_relative_profits(statlist, referent)
+        plot_utils.plot_relative_invs(statlist, referent)
+        for agent, stats in zip(experiment.agents, statlist):
+            if agent in LEARNING_AGENTS:
+                plot_utils.plot_episode_rewards(stats, 50)
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Train and compare market making agents. Without a command, the "
+                                                 "default comparison is run.")
+    commands = parser.add_subparsers(dest="command")
+
+    train = commands.add_parser("train", help="run experiments of manifests, one after another")
+    train.add_argument("manifests", nargs="+", help="JSON or YAML experiment manifests")
+    train.add_argument("--workers", type=int, help="worker processes shared by all experiments (default all cores)")
+
+    evaluation = commands.add_parser("evaluate", help="evaluate trained policies without exploration")
+    evaluation.add_argument("manifests", nargs="+", help="JSON or YAML experiment manifests")
+    evaluation.add_argument("--episodes", type=int, default=10000, help="evaluation episodes (default 10000)")
+    evaluation.add_argument("--envs", type=int, default=1000, help="episodes simulated in lockstep (default 1000)")
+
+    comparison = commands.add_parser("compare", help="compare trained policies until their ranking is decided")
+    comparison.add_argument("manifests", nargs="+", help="JSON or YAML experiment manifests")
+    comparison.add_argument("--confidence", type=float, default=0.95, help="confidence level (default 0.95)")
+    comparison.add_argument("--budget", type=int, default=100000,
+                            help="maximum episodes per policy (default 100000)")
+    comparison.add_argument("--envs", type=int, default=1000, help="episodes simulated in lockstep (default 1000)")
+
+    plot = commands.add_parser("plot", help="plot statistics of trained experiments")
+    plot.add_argument("manifests", nargs="+", help="JSON or YAML experiment manifests")
+    plot.add_argument("--show", action="store_true", help="show figures instead of saving them")
+
+    commands.add_parser("benchmark", help="run benchmark suite, other arguments are passed to it")
+
+    args, extra = parser.parse_known_args(argv)
+    if args.command == "benchmark":
+        from benchmarks import suite
+        return suite.main(extra)
+    elif extra:
+        parser.error("unrecognized arguments: {}".format(" ".join(extra)))
+
+    if args.command is None:
+        main()
+        return 0
+
+    experiments = [experiment for manifest in args.manifests for experiment in load_manifest(manifest)]
+    if args.command == "train":
+        train_command(experiments, args.workers or max((e.workers or 0 for e in experiments), default=0) or None)
+    elif args.command == "evaluate":
+        evaluate_command(experiments, args.episodes, args.envs)
+    elif args.command == "compare":
+        compare_command(experiments, args.confidence, args.budget, args.envs)
+    elif args.command == "plot":
+        plot_command(experiments, args.show)
+    return 0
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(cli())
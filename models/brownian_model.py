@@ -1,6 +1,5 @@
 import numpy as np
 import math
-import matplotlib.pyplot as plt
 
 
 class StochasticProcess:
@@ -8,30 +7,62 @@ class StochasticProcess:
     Brownian motion to simulate stock price changes.
     """
 
-    def __init__(self, total_time, dt, volatility, initial_asset_price, drift=0):
+    def __init__(self, total_time, dt, volatility, initial_asset_price, drift=0, geometric=False, rng=None):
         self.total_time = total_time
         self.dt = dt
         self.volatility = volatility
         self.initial_asset_price = initial_asset_price
         self.current_asset_price = initial_asset_price
-        self.asset_prices = [initial_asset_price]
+        self.asset_prices = np.array([initial_asset_price], dtype=float)
         self.drift = drift
+        self.geometric = geometric
+
+        # Source of normal increments, global numpy state unless a generator (or a seed for one) is given
+        if rng is None:
+            self.rng = np.random
+        elif isinstance(rng, np.random.Generator):
+            self.rng = rng
+        else:
+            self.rng = np.random.default_rng(rng)
+
+    @property
+    def n_steps(self):
+        """Number of price increments in one simulated series."""
+        return int(self.total_time / self.dt)
 
     def generate_series(self):
         """
         Run one price simulation in given time interval, save asset prices to internal state and return them.
         """
-        self.current_asset_price = self.initial_asset_price
-        self.asset_prices = [self.initial_asset_price]
+        self.asset_prices = self.generate_batch(1)[0]
+        self.current_asset_price = self.asset_prices[-1]
 
-        for i in range(int(self.total_time / self.dt)):
+        return self.asset_prices
+
+    def generate_batch(self, n_paths):
+        """
+        Run n_paths independent price simulations at once. All increments are drawn in a single call and accumulated
+        with cumsum.
+        :param n_paths: number of price series
+        :return: Array of shape (n_paths, n_steps + 1), first column being the initial asset price
+        """
+        dw = self.rng.normal(0, math.sqrt(self.dt), size=(n_paths, self.n_steps))
+        paths = np.empty((n_paths, self.n_steps + 1))
+
+        if self.geometric:
+            # standard geometric Brownian motion, dS = S * (drift * dt + volatility * dW)
+            log_returns = (self.drift - 0.5 * self.volatility ** 2) * self.dt + self.volatility * dw
+            paths[:, 0] = 0
+            np.cumsum(log_returns, axis=1, out=paths[:, 1:])
+            np.exp(paths, out=paths)
+            paths *= self.initial_asset_price
+        else:
             # simpler model than standard geometric Brownian motion, to be compatible with Avellaneda-Stoikov work
-            # dS = self.current_asset_price * (self.drift * self.dt + self.volatility * dW)
-            dS = self.volatility * np.random.normal(0, math.sqrt(self.dt))
-            self.current_asset_price += dS
-            self.asset_prices.append(self.current_asset_price)
+            paths[:, 0] = self.initial_asset_price
+            np.cumsum(self.drift * self.dt + self.volatility * dw, axis=1, out=paths[:, 1:])
+            paths[:, 1:] += self.initial_asset_price
 
-        return self.asset_prices
+        return paths
 
     def to_file(self, name):
         """
@@ -48,6 +79,8 @@ class StochasticProcess:
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     p = StochasticProcess(1, 0.005, 2, 100)
     p.generate_series()
     p.to_file('models/data_new.csv')
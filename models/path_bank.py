@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class PathBank:
+    """
+    Fixed collection of simulated price paths. Paths are generated once and can be replayed by index in any
+    environment, so different agents can be compared on exactly the same prices. Banks saved to a .npy file are
+    memory-mapped, only the paths actually replayed are read into memory.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    @classmethod
+    def from_process(cls, process, n_paths):
+        """
+        Generate an in-memory bank.
+        :param process: StochasticProcess used to simulate the paths
+        :param n_paths: number of paths
+        :return: PathBank
+        """
+        return cls(process.generate_batch(n_paths))
+
+    @classmethod
+    def create(cls, filename, process, n_paths, chunk_size=10000):
+        """
+        Generate a bank directly into a .npy file, chunk by chunk, so that it never has to fit in memory.
+        :param filename: path of the .npy file
+        :param process: StochasticProcess used to simulate the paths
+        :param n_paths: number of paths
+        :param chunk_size: number of paths generated at once
+        :return: PathBank memory-mapped from the new file
+        """
+        out = np.lib.format.open_memmap(filename, mode='w+', dtype=float, shape=(n_paths, process.n_steps + 1))
+        for start in range(0, n_paths, chunk_size):
+            stop = min(start + chunk_size, n_paths)
+            out[start:stop] = process.generate_batch(stop - start)
+        out.flush()
+        del out
+
+        return cls.load(filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Open an existing bank without reading it into memory.
+        :param filename: path of the .npy file
+        :return: PathBank
+        """
+        return cls(np.load(filename, mmap_mode='r'))
+
+    @property
+    def n_steps(self):
+        """Number of price increments in every path."""
+        return self.paths.shape[1] - 1
+
+    def __len__(self):
+        return self.paths.shape[0]
+
+    def __getitem__(self, index):
+        return np.array(self.paths[index])
+
+    def replay(self, start=0):
+        """
+        Create a process replacement that hands out bank paths in order, starting from given index.
+        :param start: index of the first path
+        :return: PathReplay
+        """
+        return PathReplay(self, start)
+
+
+class PathReplay:
+    """
+    Stands in for StochasticProcess in an environment. Instead of simulating, every generated series is the next path
+    of a PathBank. Indices wrap around once the bank is exhausted.
+    """
+
+    def __init__(self, bank, start=0):
+        self.bank = bank
+        self.index = start
+        self.asset_prices = None
+
+    @property
+    def n_steps(self):
+        """Number of price increments in every path."""
+        return self.bank.n_steps
+
+    def seek(self, index):
+        """Make path with given index the next one handed out."""
+        self.index = index
+
+    def generate_series(self):
+        """
+        Return next path of the bank.
+        """
+        self.asset_prices = self.bank[self.index % len(self.bank)]
+        self.index += 1
+
+        return self.asset_prices
+
+    def generate_batch(self, n_paths):
+        """
+        Return next n_paths paths of the bank.
+        :return: Array of shape (n_paths, n_steps + 1)
+        """
+        indices = (self.index + np.arange(n_paths)) % len(self.bank)
+        self.index += n_paths
+
+        return self.bank[indices]
@@ -0,0 +1,124 @@
+import json
+import os
+
+import numpy as np
+
+# Binary files are raw little-endian float64 rows, described by a JSON header next to them
+DTYPE = "<f8"
+
+
+def ingest(csv_filename, output_filename, price_columns=("price",), time_column=None, sep=",", chunk_size=1000000):
+    """
+    Convert a CSV file of ticks or quotes to the binary format read by TickData. The file is read chunk by chunk, so
+    it never has to fit in memory. Rows with missing values are dropped.
+    :param csv_filename: CSV file with a header row
+    :param output_filename: binary file to write, header is written to output_filename + ".json"
+    :param price_columns: column holding the price, or several columns (e.g. bid and ask) whose mean is the price
+    :param time_column: optional numeric column of timestamps, kept as column "time"
+    :param sep: CSV delimiter
+    :param chunk_size: number of CSV rows read at once
+    :return: TickData opened on the new file
+    """
+    import pandas as pd
+
+    price_columns = list(price_columns)
+    usecols = price_columns + ([time_column] if time_column is not None else [])
+    columns = ["price"] + (["time"] if time_column is not None else [])
+
+    n_rows = 0
+    with open(output_filename, "wb") as f:
+        for chunk in pd.read_csv(csv_filename, sep=sep, usecols=usecols, chunksize=chunk_size):
+            chunk = chunk.dropna()
+            rows = np.empty((len(chunk), len(columns)), dtype=DTYPE)
+            rows[:, 0] = chunk[price_columns].to_numpy(dtype=float).mean(axis=1)
+            if time_column is not None:
+                rows[:, 1] = chunk[time_column].to_numpy(dtype=float)
+            rows.tofile(f)
+            n_rows += len(rows)
+
+    with open(output_filename + ".json", "w") as f:
+        json.dump({"dtype": DTYPE, "shape": [n_rows, len(columns)], "columns": columns,
+                   "source": os.path.basename(csv_filename)}, f, indent=2)
+
+    return TickData(output_filename)
+
+
+class TickData:
+    """
+    Recorded prices in the binary format written by ingest, memory-mapped. Opening is instant whatever the size of
+    the file, and only the parts actually accessed are read.
+    """
+
+    def __init__(self, filename):
+        with open(filename + ".json") as f:
+            header = json.load(f)
+        self.columns = header["columns"]
+        self.rows = np.memmap(filename, dtype=header["dtype"], mode="r", shape=tuple(header["shape"]))
+
+    def __len__(self):
+        return self.rows.shape[0]
+
+    def column(self, name):
+        """
+        :return: Memory-mapped view of a column, "price" or "time"
+        """
+        return self.rows[:, self.columns.index(name)]
+
+    @property
+    def prices(self):
+        return self.column("price")
+
+    def windows(self, n_steps, rng=None):
+        """
+        Create a process replacement handing out random windows of n_steps + 1 consecutive prices.
+        :return: TickWindows
+        """
+        return TickWindows(self, n_steps, rng)
+
+
+class TickWindows:
+    """
+    Stands in for StochasticProcess in an environment. Every generated series is a window of consecutive recorded
+    prices, starting at a uniformly random tick. Only the window is copied out of the memory map.
+    """
+
+    def __init__(self, data, n_steps, rng=None):
+        if len(data) <= n_steps:
+            raise ValueError("Data has {} ticks, windows need {}".format(len(data), n_steps + 1))
+        self.data = data
+        self._n_steps = n_steps
+        self.asset_prices = None
+
+        # Source of window starts, global numpy state unless a generator (or a seed for one) is given
+        if rng is None:
+            self.rng = np.random
+        elif isinstance(rng, np.random.Generator):
+            self.rng = rng
+        else:
+            self.rng = np.random.default_rng(rng)
+
+    @property
+    def n_steps(self):
+        """Number of price increments in one window."""
+        return self._n_steps
+
+    def _starts(self, n_windows):
+        n_starts = len(self.data) - self._n_steps
+        return (self.rng.random(n_windows) * n_starts).astype(int)
+
+    def generate_series(self):
+        """
+        Return a random window of prices.
+        """
+        start = self._starts(1)[0]
+        self.asset_prices = np.array(self.data.prices[start:start + self._n_steps + 1])
+
+        return self.asset_prices
+
+    def generate_batch(self, n_paths):
+        """
+        Return n_paths random windows of prices.
+        :return: Array of shape (n_paths, n_steps + 1)
+        """
+        prices = self.data.prices
+        return np.stack([prices[start:start + self._n_steps + 1] for start in self._starts(n_paths)])
@@ -1,60 +1,263 @@
-from collections import namedtuple
+import os
 
 import numpy as np
-import pandas as pd
-import seaborn as sns
 from matplotlib import pyplot as plt
 
-EpisodeStats = namedtuple("Stats",
-                          ["label", "episode_lengths", "episode_rewards", "episode_profits", "episode_inventory"])
+# Re-exported, EpisodeStats used to be defined here
+from learning.stats import EpisodeStats
+
+# Directory figures are saved to instead of being shown, set by headless() or the PLOT_DIR environment variable
+OUTPUT_DIR = os.environ.get("PLOT_DIR")
+_saved_figures = 0
+
+# Largest number of points drawn for one series, longer ones are decimated
+MAX_POINTS = 10000
+
+# Number of values processed at once when series are read chunk by chunk
+BLOCK_SIZE = 2 ** 16
+
+
+def headless(output_dir):
+    """
+    Switch to a non-interactive backend and save every figure to a numbered .png file in output_dir instead of
+    showing it. None switches back to showing figures.
+    """
+    global OUTPUT_DIR
+    OUTPUT_DIR = output_dir
+    if output_dir is not None:
+        plt.switch_backend("Agg")
+
+
+def _show(name):
+    """
+    Show current figure, or save it under given name in headless mode.
+    """
+    global _saved_figures
+    if OUTPUT_DIR is None:
+        plt.show()
+        return
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    _saved_figures += 1
+    plt.savefig(os.path.join(OUTPUT_DIR, "{:02d}_{}.png".format(_saved_figures, name)))
+    plt.close()
+
+
+def _chunks(series):
+    """
+    Values of an EpisodeStats field, chunk by chunk. Lazily read columns (learning.recorder.LazyColumn) are
+    memory-mapped one chunk at a time, arrays are a single chunk.
+    """
+    if hasattr(series, "iter_chunks"):
+        for chunk in series.iter_chunks():
+            yield np.asarray(chunk, dtype=float)
+    else:
+        yield np.asarray(series, dtype=float)
+
+
+def _blocks(chunks, size=BLOCK_SIZE):
+    """
+    Regroup chunks into blocks of size values, last one possibly shorter, so that series chunked differently can be
+    combined block by block.
+    """
+    carry = np.empty(0)
+    for chunk in chunks:
+        carry = np.concatenate((carry, chunk))
+        n_full = len(carry) // size * size
+        for start in range(0, n_full, size):
+            yield carry[start:start + size]
+        carry = carry[n_full:]
+    if len(carry):
+        yield carry
+
+
+def _indexed(chunks, start=0):
+    """
+    Pair every chunk with x values counting up from start.
+    :return: generator of (x, y) chunks
+    """
+    for chunk in chunks:
+        yield np.arange(start, start + len(chunk)), chunk
+        start += len(chunk)
+
+
+def _is_aggregate(stats):
+    """
+    True for learning.aggregates.OnlineAggregate, which keeps decimated histories instead of full arrays.
+    """
+    return hasattr(stats, "cumulative_profit")
+
+
+def decimate(x, y, max_points=MAX_POINTS):
+    """
+    Reduce a series to at most max_points points for drawing. Series is split into max_points / 2 buckets and
+    minimum and maximum of every bucket are kept, so spikes remain visible.
+    :return: decimated x and y
+    """
+    return decimate_chunks(len(y), [(np.asarray(x), np.asarray(y))], max_points)
+
+
+def decimate_chunks(n, chunks, max_points=MAX_POINTS):
+    """
+    Same as decimate() on a series of n points given as (x, y) chunks, which are processed one at a time, so the
+    series never has to be in memory at once.
+    :return: decimated x and y
+    """
+    if n <= max_points:
+        pairs = list(chunks)
+        if not pairs:
+            return np.empty(0), np.empty(0)
+        return np.concatenate([x for x, _ in pairs]), np.concatenate([y for _, y in pairs])
+
+    n_buckets = max_points // 2
+    size = -(-n // n_buckets)
+
+    kept_x, kept_y = [], []
+    carry_x, carry_y = np.empty(0), np.empty(0)
+
+    def keep(x, y, n_values):
+        """Keep minimum and maximum of every bucket, padded positions beyond n_values select the last value."""
+        buckets = y.reshape(-1, size)
+        offsets = np.arange(len(buckets)) * size
+        indices = np.concatenate((buckets.argmin(axis=1) + offsets, buckets.argmax(axis=1) + offsets))
+        indices = np.unique(np.minimum(indices, n_values - 1))
+        kept_x.append(x[indices])
+        kept_y.append(y[indices])
+        return indices[-1] == n_values - 1
+
+    # Full buckets are reduced as soon as they are complete, the rest is carried over to the next chunk
+    last_x = last_y = None
+    kept_last = False
+    for x, y in chunks:
+        if len(y):
+            last_x, last_y = x[-1], y[-1]
+        carry_x, carry_y = np.concatenate((carry_x, x)), np.concatenate((carry_y, y))
+        n_full = len(carry_y) // size * size
+        if n_full:
+            kept_last = keep(carry_x[:n_full], carry_y[:n_full], n_full)
+            carry_x, carry_y = carry_x[n_full:], carry_y[n_full:]
+
+    # Last bucket is padded with its last value
+    if len(carry_y):
+        pad = size - len(carry_y)
+        kept_last = keep(np.concatenate((carry_x, np.full(pad, carry_x[-1]))),
+                         np.concatenate((carry_y, np.full(pad, carry_y[-1]))), len(carry_y))
+    x, y = np.concatenate(kept_x), np.concatenate(kept_y)
+
+    # Buckets entirely beyond the end of the series select its last point
+    if -(-n // size) < n_buckets and not kept_last:
+        x, y = np.append(x, last_x), np.append(y, last_y)
+    return x, y
+
+
+def _length(stats, field):
+    """
+    Number of episodes in an EpisodeStats field, without reading it.
+    """
+    return len(getattr(stats, field))
+
+
+def _cumulative(stats, field, initial=0):
+    """
+    Cumulative sum of an EpisodeStats field, computed block by block with a running offset, or the matching
+    decimated history of an aggregate.
+    :return: generator of (x, y) blocks of the series
+    """
+    if _is_aggregate(stats):
+        series = stats.cumulative_profit if field == "episode_profits" else stats.cumulative_inventory
+        yield from zip(_blocks([series.x]), _blocks([series.y]))
+        return
+    total = 0.
+    for x, values in _indexed(_blocks(_chunks(getattr(stats, field)))):
+        cumulative = total + np.cumsum(values - initial)
+        total = cumulative[-1]
+        yield x, cumulative
+
+
+def _rolling_mean(chunks, window):
+    """
+    Rolling mean of a chunked series, from differences of its running cumulative sum. First full window ends at
+    index window - 1.
+    :return: generator of (x, y) chunks
+    """
+    tail = np.zeros(1)
+    total = 0.
+    start = window - 1
+    for chunk in chunks:
+        cumulative = total + np.cumsum(chunk)
+        if len(cumulative):
+            total = cumulative[-1]
+        full = np.concatenate((tail, cumulative))
+        smoothed = (full[window:] - full[:-window]) / window
+        tail = full[-window:]
+        yield np.arange(start, start + len(smoothed)), smoothed
+        start += len(smoothed)
+
+
+def _cumulative_length(stats, field):
+    """
+    Number of points of the series _cumulative() generates.
+    """
+    if _is_aggregate(stats):
+        series = stats.cumulative_profit if field == "episode_profits" else stats.cumulative_inventory
+        return len(series.y)
+    return _length(stats, field)
 
 
 def plot_relative_profits(statlist, referent=0):
     """
-    Plot profits of multiple EpisodeStats given, relative to specific agent.
+    Plot profits of multiple EpisodeStats (or online aggregates) given, relative to specific agent.
     """
-    profits = np.array(list(map(lambda s: s.episode_profits, statlist)))
-    profits -= 1000
-    profits = np.cumsum(profits, axis=1)
-    profits -= profits[referent]
+    n = _cumulative_length(statlist[referent], "episode_profits")
 
-    for i in range(len(statlist)):
-        plt.plot(profits[i], label=statlist[i].label)
+    for stats in statlist:
+        blocks = ((x, profits - referent_profits) for (x, profits), (_, referent_profits) in
+                  zip(_cumulative(stats, "episode_profits", 1000),
+                      _cumulative(statlist[referent], "episode_profits", 1000)))
+        plt.plot(*decimate_chunks(n, blocks), label=stats.label)
 
     plt.legend(loc="best")
     plt.xlabel("Episode")
     plt.ylabel("Cumulative profit")
     plt.title("Cumulative profit relative to Zero-tick agent over time")
 
-    plt.show()
+    _show("relative_profits")
 
 
 def plot_relative_invs(statlist, referent=0):
     """
-    Plot cumulative mean inventories of multiple EpisodeStats given, relative to specific agent.
+    Plot cumulative mean inventories of multiple EpisodeStats (or online aggregates) given, relative to specific agent.
     """
-    invs = np.array(list(map(lambda s: s.episode_inventory, statlist)))
-    invs = np.cumsum(invs, axis=1)
-    invs -= invs[referent]
+    n = _cumulative_length(statlist[referent], "episode_inventory")
 
-    for i in range(len(statlist)):
-        plt.plot(invs[i], label=statlist[i].label)
+    for stats in statlist:
+        blocks = ((x, invs - referent_invs) for (x, invs), (_, referent_invs) in
+                  zip(_cumulative(stats, "episode_inventory"), _cumulative(statlist[referent], "episode_inventory")))
+        plt.plot(*decimate_chunks(n, blocks), label=stats.label)
 
     plt.legend(loc="best")
     plt.xlabel("Episode")
     plt.ylabel("Mean absolute episode inventory")
     plt.title("Absolute cumulative inventory relative to Zero-tick agent over time")
 
-    plt.show()
+    _show("relative_inventory")
 
 
 def plot_value_heatmap(q):
-    """For every state-action pair, show action value. Results are shown in a heatmap."""
-    ser = pd.DataFrame.from_dict(dict(q), orient='index')
-    ser = ser.sort_index()
+    """
+    For every state-action pair, show action value. Results are shown in a heatmap.
+    :param q: QTable, (n_states, n_actions) array or dictionary mapping state -> action values
+    """
+    import seaborn as sns
+
+    if isinstance(q, dict):
+        import pandas as pd
+        ser = pd.DataFrame.from_dict(dict(q), orient='index')
+        ser = ser.sort_index()
+    else:
+        ser = np.asarray(q)
     plt.figure(figsize=(20, 10))
     sns.heatmap(ser, linewidths=0.5, cmap="YlGnBu", square=False)
-    plt.show()
+    _show("value_heatmap")
 
 
 def plot_episode_lengths(stats):
@@ -65,58 +268,70 @@ def plot_episode_lengths(stats):
     """
     # Plot the episode length over time
     fig = plt.figure(figsize=(10, 5))
-    plt.plot(stats.episode_lengths)
+    plt.plot(*decimate_chunks(_length(stats, "episode_lengths"), _indexed(_chunks(stats.episode_lengths))))
     plt.xlabel("Episode")
     plt.ylabel("Episode Length")
     plt.title("Episode Length over Time")
-    plt.show()
+    _show("episode_lengths")
     return fig
 
 
 def plot_episode_rewards(stats, smoothing_window=10):
     """
     Shows reward amounts through time (smoothed).
-    :param stats: EpisodeStats
+    :param stats: EpisodeStats, or online aggregate whose own smoothing window is then used
     :param smoothing_window: smoothing window
     :return: figure
     """
     fig = plt.figure(figsize=(10, 5))
-    rewards_smoothed = pd.Series(stats.episode_rewards).rolling(smoothing_window, min_periods=smoothing_window).mean()
-    plt.plot(rewards_smoothed)
+    if _is_aggregate(stats):
+        smoothing_window = stats.smoothing_window
+        x, rewards_smoothed = decimate(stats.rolling_rewards.x, stats.rolling_rewards.y)
+    else:
+        n = max(_length(stats, "episode_rewards") - smoothing_window + 1, 0)
+        x, rewards_smoothed = decimate_chunks(n, _rolling_mean(_chunks(stats.episode_rewards), smoothing_window))
+    finite = np.isfinite(rewards_smoothed)
+    plt.plot(x[finite], rewards_smoothed[finite])
     plt.xlabel("Episode")
     plt.ylabel("Episode Reward (Smoothed)")
     plt.title("Episode Reward over Time (Smoothed over window size {})".format(smoothing_window))
-    plt.show()
+    _show("episode_rewards")
     return fig
 
 
 def plot_episode_profit(stats):
     """
     Shows profit through time
-    :param stats: EpisodeStats
+    :param stats: EpisodeStats or online aggregate
     :return: figure
     """
     fig = plt.figure(figsize=(10, 5))
-    plt.plot(stats.episode_profits)
+    if _is_aggregate(stats):
+        plt.plot(*decimate(stats.profits.x, stats.profits.y))
+    else:
+        plt.plot(*decimate_chunks(_length(stats, "episode_profits"), _indexed(_chunks(stats.episode_profits))))
     plt.xlabel("Episode")
     plt.ylabel("Episode profit")
     plt.title("Episode Profit over Time")
-    plt.show()
+    _show("episode_profit")
     return fig
 
 
 def plot_episode_inventory(stats):
     """
     Shows inventory at the end of every episode.
-    :param stats: EpisodeStats
+    :param stats: EpisodeStats or online aggregate
     :return: figure
     """
     fig = plt.figure(figsize=(10, 5))
-    plt.plot(stats.episode_inventory)
+    if _is_aggregate(stats):
+        plt.plot(*decimate(stats.inventories.x, stats.inventories.y))
+    else:
+        plt.plot(*decimate_chunks(_length(stats, "episode_inventory"), _indexed(_chunks(stats.episode_inventory))))
     plt.xlabel("Episode")
     plt.ylabel("Episode Inventory")
     plt.title("Episode Inventory over Time")
-    plt.show()
+    _show("episode_inventory")
     return fig
 
 
@@ -127,9 +342,10 @@ def plot_episode_times(stats):
     :return: figure
     """
     fig = plt.figure(figsize=(10, 5))
-    plt.plot(np.cumsum(stats.episode_lengths), np.arange(len(stats.episode_lengths)))
+    blocks = ((steps, episodes) for episodes, steps in _cumulative(stats, "episode_lengths"))
+    plt.plot(*decimate_chunks(_length(stats, "episode_lengths"), blocks))
     plt.xlabel("Time Steps")
     plt.ylabel("Episode")
     plt.title("Episode per time step")
-    plt.show()
+    _show("episode_times")
     return fig